@@ -0,0 +1,196 @@
+"""
+Comprovacions de consistència que es poden tornar a executar després de cada canvi.
+
+Cada comprovació genera instàncies amb llavors fixes, hi fa un recorregut aleatori i compara el que mantenen
+els càlculs incrementals amb el que dona recalcular-ho tot. Retorna la llista d'errors trobats (buida si tot és
+correcte); amb la línia d'ordres s'executen les comprovacions demanades i el procés acaba amb 1 si n'hi ha cap error.
+
+Ús:
+    python -m experiments.comprovacions [--comprovacions deltes regret pressupost_sa] [--seeds 1234 1235]
+"""
+
+import argparse
+import random
+import sys
+from typing import Callable, Dict, List
+
+from implementacio.abia_Gasolina import Gasolineres, CentresDistribucio
+from implementacio.camions_parametres import ProblemParameters
+from implementacio.camions_estat import (StateRepresentation, generate_greedy_initial_state,
+                                         generate_random_initial_state, generate_regret_initial_state)
+from implementacio.camions_operadors import swapCentres
+from experiments.escalabilitat import executa_cas
+
+
+SEEDS = (1234, 1235, 1236, 1237)
+TOLERANCIA = 1e-6
+
+
+def parametres(seed: int, num_centres: int = 10, num_gasolineres: int = 100, multiplicitat: int = 1) -> ProblemParameters:
+    return ProblemParameters(km=640, n_viatges=5, valor=1000, cost_km=2,
+                             gasolineres=Gasolineres(num_gasolineres=num_gasolineres, seed=seed),
+                             centres=CentresDistribucio(num_centres=num_centres, multiplicitat=multiplicitat, seed=seed))
+
+
+def benefici_complet(estat: StateRepresentation) -> float:
+    """
+    Benefici recalculat des de zero, sense cap valor mantingut incrementalment.
+    """
+    copia = estat._copy()
+    copia.invalidar_caches()
+    return -copia.heuristica()
+
+
+def comprova_deltes(seeds=SEEDS, passos: int = 50, mostres: int = 20) -> List[str]:
+    """
+    Per cada operador d'una mostra del veïnatge (mourePeticio, swapCentres i swapPeticions), delta_benefici ha de ser
+    igual a la diferència entre el benefici recalculat després d'aplicar-lo amb aplicar_in_situ i el d'abans; i el
+    benefici, els km per camió i la penalització que aplicar_in_situ manté han de coincidir amb els recalculats.
+    """
+    errors = []
+    aleatori = random.Random(0)
+    for seed in seeds:
+        params = parametres(seed, multiplicitat=1 + seed % 2)
+        for estat in (generate_greedy_initial_state(params), generate_random_initial_state(params, seed)):
+            estat.heuristica()
+            for pas in range(passos):
+                accions = list(estat.generate_all_actions(swap_peticions=True))
+                if not accions:
+                    break
+                benefici = benefici_complet(estat)
+                # Amb el límit de km gairebé cap swapCentres és factible: se n'afegeixen alguns a l'atzar
+                mostra = aleatori.sample(accions, min(mostres, len(accions)))
+                mostra += [swapCentres(*aleatori.sample(range(len(estat.camions)), 2)) for _ in range(3)]
+                for accio in mostra:
+                    delta = estat.delta_benefici(accio)
+                    vei = estat._copy()
+                    vei.aplicar_in_situ(accio)
+                    esperat = benefici_complet(vei) - benefici
+                    if abs(delta - esperat) > TOLERANCIA:
+                        errors.append(f"seed {seed}, pas {pas}: {accio} té delta {delta} però el benefici canvia {esperat}")
+
+                estat.aplicar_in_situ(aleatori.choice(accions))
+                recalculat = estat._copy()
+                recalculat.invalidar_caches()
+                if abs(estat.heuristica() - recalculat.heuristica()) > TOLERANCIA:
+                    errors.append(f"seed {seed}, pas {pas}: benefici mantingut {-estat.heuristica()} "
+                                  f"i recalculat {-recalculat.heuristica()}")
+                if any(abs(a - b) > TOLERANCIA for a, b in zip(estat._km_camions(), recalculat._km_camions())):
+                    errors.append(f"seed {seed}, pas {pas}: els km mantinguts no coincideixen amb els recalculats")
+                if abs(estat.calcular_penalitzacio_pendents() - recalculat.calcular_penalitzacio_pendents()) > TOLERANCIA:
+                    errors.append(f"seed {seed}, pas {pas}: la penalització mantinguda no coincideix amb la recalculada")
+                if errors:
+                    return errors
+    return errors
+
+
+def regret_exhaustiu(params: ProblemParameters, k: int = 2, veins_propers: int = None) -> StateRepresentation:
+    """
+    Referència de generate_regret_initial_state: a cada pas recalcula el regret de totes les peticions pendents
+    a partir dels viatges (amb CostViatges) i insereix la de més regret. És quadràtica; només per comprovar.
+    :param veins_propers: camions candidats de cada petició, com a generate_regret_initial_state (None per tots)
+    """
+    estat = StateRepresentation(params)
+    num_camions = len(estat.camions)
+    if veins_propers is None or veins_propers >= num_camions:
+        candidats = [list(range(num_camions))] * len(estat.peticions_info)
+    else:
+        propers = estat.instancia.camions_propers(veins_propers)
+        candidats = [sorted(propers[g, :veins_propers].tolist()) for g in estat.gasolinera_per_peticio]
+    cost_viatges = estat.instancia.cost_viatges
+    limit = estat.limit_km()
+    km_camions = [0.0] * len(estat.camions)
+    pendents = set(range(len(estat.peticions_info)))
+
+    def km_insercio(id_camio: int, i_peticio: int) -> float:
+        viatges = estat.camions[id_camio]
+        if viatges and len(viatges[-1]) == 1:
+            km = cost_viatges.km(id_camio, viatges[-1] + [i_peticio]) - cost_viatges.km(id_camio, viatges[-1])
+        elif len(viatges) < params.n_viatges:
+            km = cost_viatges.km(id_camio, [i_peticio])
+        else:
+            return float("inf")
+        return float("inf") if limit is not None and km_camions[id_camio] + km > limit else km
+
+    while True:
+        millor_entrada = None
+        for i_peticio in pendents:
+            km = {id_camio: km_insercio(id_camio, i_peticio) for id_camio in candidats[i_peticio]}
+            beneficis = {id_camio: estat._valor_servir(i_peticio) - x * params.cost_km for id_camio, x in km.items()}
+            camio = max(beneficis, key=lambda id_camio: (beneficis[id_camio], -id_camio))
+            millor = beneficis[camio]
+            if millor <= 0:
+                continue
+            seguents = sorted((max(b, 0) for b in beneficis.values()), reverse=True)[1:k]
+            regret = sum(millor - b for b in seguents) + (k - 1 - len(seguents)) * millor
+            entrada = (-regret, -millor, i_peticio, camio, km[camio])
+            if millor_entrada is None or entrada < millor_entrada:
+                millor_entrada = entrada
+        if millor_entrada is None:
+            return estat
+        _, _, i_peticio, camio, km = millor_entrada
+        pendents.remove(i_peticio)
+        km_camions[camio] += km
+        viatges = estat.camions[camio]
+        if viatges and len(viatges[-1]) == 1:
+            viatges[-1].append(i_peticio)
+        else:
+            viatges.append([i_peticio])
+
+
+def comprova_regret(seeds=SEEDS, ks=(1, 2, 3), veins=(None, 4)) -> List[str]:
+    """
+    generate_regret_initial_state ha de fer les mateixes insercions, en el mateix ordre dins de cada camió,
+    que la referència que recalcula el regret de totes les peticions a cada pas. Es proven instàncies amb pocs
+    camions (on s'omplen i el regret canvia més) i amb molts, amb tots els camions com a candidats i amb pocs.
+    """
+    errors = []
+    for seed in seeds:
+        for num_centres, multiplicitat in ((5, 3), (10, 1), (20, 1)):
+            params = parametres(seed, num_centres=num_centres, multiplicitat=multiplicitat)
+            for k in ks:
+                for veins_propers in veins:
+                    estat = generate_regret_initial_state(params, k, veins_propers)
+                    referencia = regret_exhaustiu(params, k, veins_propers)
+                    if estat.camions != referencia.camions:
+                        errors.append(f"seed {seed}, {num_centres}x{multiplicitat} camions, k={k}, "
+                                      f"veins_propers={veins_propers}: benefici {-estat.heuristica()} "
+                                      f"però la referència fa {-referencia.heuristica()}")
+    return errors
+
+
+def comprova_pressupost_sa(seeds=SEEDS, pressupost: float = 2.0) -> List[str]:
+    """
+    El Simulated Annealing del banc d'escalabilitat ha d'aprofitar tot el pressupost de temps: s'ha d'aturar per
+    temps (o pel callback que el vigila), no perquè la temperatura hagi arribat a 0 abans.
+    """
+    errors = []
+    for seed in seeds:
+        execucio = executa_cas(10, 100, seed, "sa", "greedy", pressupost)
+        if execucio["motiu_aturada"] not in ("temps", "callback") or execucio["temps"] < 0.99 * pressupost:
+            errors.append(f"seed {seed}: el SA s'atura per '{execucio['motiu_aturada']}' als {execucio['temps']:.2f}s "
+                          f"d'un pressupost de {pressupost}s")
+    return errors
+
+
+COMPROVACIONS: Dict[str, Callable] = {
+    "deltes": comprova_deltes,
+    "regret": comprova_regret,
+    "pressupost_sa": comprova_pressupost_sa,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comprovacions de consistència dels càlculs incrementals")
+    parser.add_argument("--comprovacions", nargs="+", default=list(COMPROVACIONS), choices=list(COMPROVACIONS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=list(SEEDS))
+    args = parser.parse_args()
+
+    fallades = 0
+    for nom in args.comprovacions:
+        errors = COMPROVACIONS[nom](args.seeds)
+        print(f"{nom:24s} {'correcte' if not errors else f'{len(errors)} errors'}")
+        for error in errors[:10]:
+            print(f"    {error}")
+        fallades += bool(errors)
+    sys.exit(1 if fallades else 0)
@@ -0,0 +1,184 @@
+"""
+Banc d'escalabilitat de punta a punta: executa Hill Climbing i Simulated Annealing sobre instàncies generades
+de fins a 500 centres i 10.000 gasolineres amb un pressupost de temps de rellotge per execució, i en desa en JSON
+la corba temps-qualitat (millor benefici en funció del temps transcorregut) i la memòria màxima (RSS) del procés.
+El cas 'regret' mesura la construcció de l'estat inicial per regret-k (sense pressupost): el temps que triga i el
+benefici que assoleix respecte de l'estat inicial.
+
+Cada execució es fa en un procés nou, de manera que la memòria màxima que es mesura és només la d'aquella execució.
+
+Ús:
+    python -m experiments.escalabilitat [--mides 50:500 100:1000 500:10000] [--algorismes hc hc_candidats sa regret]
+                                        [--pressupost 60] [--seeds 1234] [--temperatura-final-sa 1]
+                                        [--sortida escalabilitat.json]
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from implementacio.abia_Gasolina import Gasolineres, CentresDistribucio
+from implementacio.camions_parametres import ProblemParameters
+from implementacio.camions_paralel import GENERADORS
+from implementacio.camions_estat import generate_regret_initial_state
+from implementacio.camions_cerca import (ResultatCerca, cerca_hill_climbing, cerca_simulated_annealing,
+                                         exp_schedule_temps)
+
+
+MIDES = ((10, 100), (50, 500), (100, 1000), (200, 2000), (500, 5000), (500, 10000)) # (centres, gasolineres)
+ALGORISMES = ("hc", "hc_candidats", "sa", "regret")
+PRESSUPOST_PER_DEFECTE = 60.0  # Segons de cerca per execució
+VEINS_PROPERS = 10             # Camions candidats de cada petició a 'hc_candidats'
+INTERVAL_CORBA = 0.01          # Segons mínims entre dos punts de la corba temps-qualitat
+TEMPERATURA_FINAL_SA = 1.0     # Temperatura del SA en acabar el pressupost (el refredament depèn del temps, no de les iteracions)
+
+
+def rss_maxim_mb() -> float:
+    """
+    Memòria resident màxima del procés actual, en MB.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10 # bytes a macOS, KB a Linux
+
+
+class Corba(object):
+    """
+    Callback de les cerques de camions_cerca que va guardant el millor benefici vist en funció del temps,
+    i atura la cerca quan s'acaba el pressupost.
+    """
+
+    def __init__(self, benefici_inicial: float, pressupost: float):
+        self.inici = time.perf_counter()
+        self.pressupost = pressupost
+        self.millor = benefici_inicial
+        self.punts: List[Tuple[float, float]] = [(0.0, benefici_inicial)]
+
+    def __call__(self, iteracio, estat, benefici) -> bool:
+        temps = time.perf_counter() - self.inici
+        if benefici > self.millor:
+            self.millor = benefici
+            if temps - self.punts[-1][0] >= INTERVAL_CORBA:
+                self.punts.append((temps, benefici))
+        return temps >= self.pressupost
+
+    def tanca(self) -> List[Tuple[float, float]]:
+        temps = time.perf_counter() - self.inici
+        if self.punts[-1][1] != self.millor or temps > self.punts[-1][0]:
+            self.punts.append((temps, self.millor))
+        return self.punts
+
+
+def executa_cas(centres: int, gasolineres: int, seed: int, algorisme: str, estat_inicial: str, pressupost: float,
+                temperatura_final_sa: float = TEMPERATURA_FINAL_SA) -> dict:
+    """
+    Executa un algorisme sobre una instància amb el pressupost donat (dins d'un procés treballador).
+    :return: diccionari amb la configuració, els resultats, la corba temps-qualitat i la memòria màxima
+    """
+    inici = time.perf_counter()
+    params = ProblemParameters(km=640, n_viatges=5, valor=1000, cost_km=2,
+                               gasolineres=Gasolineres(num_gasolineres=gasolineres, seed=seed),
+                               centres=CentresDistribucio(num_centres=centres, multiplicitat=1, seed=seed))
+    estat = GENERADORS[estat_inicial](params)
+    benefici_inicial = -estat.heuristica()
+    temps_preparacio = time.perf_counter() - inici
+
+    corba = Corba(benefici_inicial, pressupost)
+    if algorisme == "hc":
+        resultat = cerca_hill_climbing(estat, temps_maxim=pressupost, callback=corba)
+    elif algorisme == "hc_candidats":
+        resultat = cerca_hill_climbing(estat, temps_maxim=pressupost, callback=corba, veins_propers=VEINS_PROPERS)
+    elif algorisme == "sa":
+        schedule = exp_schedule_temps(pressupost, temperatura_final=temperatura_final_sa)
+        resultat = cerca_simulated_annealing(estat, schedule=schedule, seed=seed, temps_maxim=pressupost, callback=corba)
+    elif algorisme == "regret":
+        # La construcció és tota l'execució: la corba va de l'estat inicial a l'estat construït, sense pressupost
+        resultat = ResultatCerca()
+        resultat.estat = generate_regret_initial_state(params)
+        resultat.benefici = -resultat.estat.heuristica()
+        resultat.iteracions = sum(len(viatge) for viatges in resultat.estat.camions for viatge in viatges) # insercions
+        resultat.temps = time.perf_counter() - corba.inici
+        resultat.motiu_aturada = "construccio"
+        corba(resultat.iteracions, resultat.estat, resultat.benefici)
+    else:
+        raise ValueError(f"Algorisme desconegut: {algorisme}. Els vàlids són {ALGORISMES}")
+
+    return {
+        "centres": centres,
+        "gasolineres": gasolineres,
+        "peticions": len(estat.peticions_info),
+        "seed": seed,
+        "algorisme": algorisme,
+        "estat_inicial": estat_inicial,
+        "pressupost": pressupost,
+        "temps_preparacio": temps_preparacio,
+        "benefici_inicial": benefici_inicial,
+        "benefici_final": max(resultat.benefici, corba.millor),
+        "iteracions": resultat.iteracions,
+        "avaluacions": resultat.avaluacions,
+        "avaluacions_per_segon": resultat.avaluacions / resultat.temps if resultat.temps > 0 else None,
+        "motiu_aturada": resultat.motiu_aturada,
+        "temps": resultat.temps,
+        "corba": corba.tanca(),
+        "rss_maxim_mb": rss_maxim_mb(),
+    }
+
+
+def executa_escalabilitat(mides=MIDES, algorismes=ALGORISMES, seeds=(1234,), estat_inicial: str = "greedy",
+                          pressupost: float = PRESSUPOST_PER_DEFECTE, temperatura_final_sa: float = TEMPERATURA_FINAL_SA,
+                          verbose: bool = True) -> dict:
+    """
+    Executa tots els casos (mida x seed x algorisme), cadascun en un procés nou i un darrere l'altre
+    perquè no competeixin pel temps de CPU.
+    :return: diccionari amb les metadades i la llista d'execucions
+    """
+    execucions = []
+    for centres, gasolineres in mides:
+        for seed in seeds:
+            for algorisme in algorismes:
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    execucio = executor.submit(executa_cas, centres, gasolineres, seed, algorisme,
+                                               estat_inicial, pressupost, temperatura_final_sa).result()
+                execucions.append(execucio)
+                if verbose:
+                    print(f"{algorisme:13s} centres={centres:4d} gasolineres={gasolineres:6d} seed={seed} -> "
+                          f"benefici {execucio['benefici_inicial']:.0f} -> {execucio['benefici_final']:.0f} "
+                          f"en {execucio['temps']:.1f}s ({execucio['motiu_aturada']}), "
+                          f"RSS {execucio['rss_maxim_mb']:.0f} MB")
+    return {
+        "metadades": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "pressupost": pressupost,
+            "estat_inicial": estat_inicial,
+            "temperatura_final_sa": temperatura_final_sa,
+        },
+        "execucions": execucions,
+    }
+
+
+def _mida(text: str) -> Tuple[int, int]:
+    centres, gasolineres = text.split(":")
+    return int(centres), int(gasolineres)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'escalabilitat de Hill Climbing i Simulated Annealing")
+    parser.add_argument("--mides", type=_mida, nargs="+", default=list(MIDES), help="mides centres:gasolineres")
+    parser.add_argument("--algorismes", nargs="+", default=list(ALGORISMES), choices=list(ALGORISMES))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1234])
+    parser.add_argument("--estat-inicial", default="greedy", choices=list(GENERADORS))
+    parser.add_argument("--pressupost", type=float, default=PRESSUPOST_PER_DEFECTE, help="segons per execució")
+    parser.add_argument("--temperatura-final-sa", type=float, default=TEMPERATURA_FINAL_SA,
+                        help="temperatura del SA en acabar el pressupost")
+    parser.add_argument("--sortida", default="escalabilitat.json", help="fitxer JSON de resultats")
+    args = parser.parse_args()
+
+    resultats = executa_escalabilitat(args.mides, args.algorismes, args.seeds, args.estat_inicial, args.pressupost,
+                                       args.temperatura_final_sa)
+    with open(args.sortida, "w") as f:
+        json.dump(resultats, f, indent=2)
@@ -0,0 +1,328 @@
+"""
+Executor d'experiments declaratiu.
+
+En lloc de repetir a cada script el bucle de generar la instància, l'estat inicial, executar la cerca i calcular
+el benefici, es descriu l'experiment amb una graella de paràmetres i cada combinació s'executa en un procés
+d'un ProcessPoolExecutor. Els resultats s'afegeixen al CSV de sortida a mesura que acaben, i si l'execució
+s'interromp, tornar-la a llançar amb la mateixa sortida només executa les combinacions que falten.
+
+Ús:
+    python -m experiments.executor graella.json resultats.csv [--processos N] [--parquet resultats.parquet]
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, List
+
+from implementacio.abia_Gasolina import Gasolineres, CentresDistribucio
+from implementacio.camions_parametres import ProblemParameters
+from implementacio.camions_paralel import GENERADORS
+from implementacio.camions_cerca import cerca_hill_climbing, cerca_simulated_annealing, exp_schedule
+
+
+# Valors per defecte de cada paràmetre de la graella (els mateixos que els experiments de l'informe)
+PARAMETRES_PER_DEFECTE = {
+    "num_gasolineres": 100,
+    "num_centres": 10,
+    "multiplicitat": 1,
+    "seed": 1234,
+    "km": 640,
+    "n_viatges": 5,
+    "valor": 1000,
+    "cost_km": 2,
+    "estat_inicial": "greedy",      # Un dels noms de camions_paralel.GENERADORS
+    "algorisme": "hc",              # 'hc', 'hc_first', 'sa', 'hc_aima' o 'sa_aima'
+    "k": 20,                        # Paràmetres de exp_schedule per Simulated Annealing
+    "lam": 0.005,
+    "limit": 100,
+    "temps_maxim": None,            # Pressupost en segons de 'hc', 'hc_first' i 'sa' (None per no limitar-lo)
+    "veins_propers": None,          # Camions candidats de cada petició (None: tots), a tots els algorismes
+    "swap_peticions": False,        # Si el veïnatge també inclou swapPeticions, a tots els algorismes
+}
+
+# Paràmetres afegits després dels primers experiments: amb el valor per defecte no entren a l'identificador,
+# de manera que els CSV anteriors es poden continuar reprenent
+PARAMETRES_OPCIONALS = ("temps_maxim", "veins_propers", "swap_peticions")
+
+ALGORISMES = ("hc", "hc_first", "sa", "hc_aima", "sa_aima")
+
+COLUMNES_RESULTAT = ["benefici", "benefici_inicial", "ingressos", "cost_km_total", "penalitzacio",
+                     "peticions_servides", "peticions_totals", "km_totals", "temps_ms"]
+
+
+def expandeix_graella(graella: Dict[str, Iterable]) -> List[dict]:
+    """
+    Producte cartesià de la graella. Cada valor de la graella és una llista de valors (o un valor sol);
+    els paràmetres que no hi són prenen el valor de PARAMETRES_PER_DEFECTE.
+    :return: llista de configuracions, cadascuna amb tots els paràmetres
+    """
+    desconeguts = set(graella) - set(PARAMETRES_PER_DEFECTE)
+    if desconeguts:
+        raise ValueError(f"Paràmetres desconeguts a la graella: {sorted(desconeguts)}")
+
+    noms = list(PARAMETRES_PER_DEFECTE)
+    valors = []
+    for nom in noms:
+        valor = graella.get(nom, PARAMETRES_PER_DEFECTE[nom])
+        valors.append(list(valor) if isinstance(valor, (list, tuple, range)) else [valor])
+
+    configuracions = []
+    for combinacio in itertools.product(*valors):
+        config = dict(zip(noms, combinacio))
+        if config["algorisme"] not in ALGORISMES:
+            raise ValueError(f"Algorisme desconegut: {config['algorisme']}. Els vàlids són {ALGORISMES}")
+        if config["estat_inicial"] not in GENERADORS:
+            raise ValueError(f"Estat inicial desconegut: {config['estat_inicial']}. Els vàlids són {list(GENERADORS)}")
+        config["id"] = id_configuracio(config)
+        configuracions.append(config)
+    return configuracions
+
+
+def id_configuracio(config: dict) -> str:
+    """
+    Identificador estable d'una configuració, per reconèixer les que ja són al CSV en reprendre l'execució.
+    """
+    claus = {nom: config[nom] for nom in PARAMETRES_PER_DEFECTE
+             if nom not in PARAMETRES_OPCIONALS or config[nom] != PARAMETRES_PER_DEFECTE[nom]}
+    return hashlib.sha1(json.dumps(claus, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def executa_configuracio(config: dict) -> dict:
+    """
+    Executa una combinació de la graella: genera la instància i l'estat inicial, fa la cerca i calcula les mètriques.
+    :return: fila de resultats (la configuració més les columnes de COLUMNES_RESULTAT)
+    """
+    # Els desempats de les cerques d'aima i dels estats inicials aleatoris fan servir el generador global, que en
+    # els processos creats amb fork comença igual a tots: es fixa a cada execució perquè el resultat sigui reproduïble
+    random.seed(config["seed"])
+    gasolineres = Gasolineres(num_gasolineres=config["num_gasolineres"], seed=config["seed"])
+    centres = CentresDistribucio(num_centres=config["num_centres"], multiplicitat=config["multiplicitat"], seed=config["seed"])
+    params = ProblemParameters(
+        km=config["km"],
+        n_viatges=config["n_viatges"],
+        valor=config["valor"],
+        cost_km=config["cost_km"],
+        gasolineres=gasolineres,
+        centres=centres
+    )
+
+    if config["estat_inicial"] == "aleatori":
+        estat_inicial = GENERADORS["aleatori"](params, config["seed"])
+    else:
+        estat_inicial = GENERADORS[config["estat_inicial"]](params)
+    benefici_inicial = -estat_inicial.heuristica()
+    algorisme = config["algorisme"]
+
+    veinatge = {"veins_propers": config["veins_propers"], "swap_peticions": config["swap_peticions"]}
+
+    inici = time.perf_counter()
+    if algorisme == "hc":
+        solucio = cerca_hill_climbing(estat_inicial, mode="steepest", temps_maxim=config["temps_maxim"],
+                                      seed=config["seed"], **veinatge).estat
+    elif algorisme == "hc_first":
+        solucio = cerca_hill_climbing(estat_inicial, mode="first", temps_maxim=config["temps_maxim"],
+                                      seed=config["seed"], **veinatge).estat
+    elif algorisme == "sa":
+        solucio = cerca_simulated_annealing(estat_inicial, k=config["k"], lam=config["lam"], limit=config["limit"],
+                                            seed=config["seed"], temps_maxim=config["temps_maxim"], **veinatge).estat
+    else:
+        from aima3.search import hill_climbing, simulated_annealing
+        from implementacio.camions_problema import CamionsProblema
+        if algorisme == "hc_aima":
+            solucio = hill_climbing(CamionsProblema(estat_inicial, **veinatge))
+        else:
+            solucio = simulated_annealing(CamionsProblema(estat_inicial, **veinatge),
+                                          exp_schedule(config["k"], config["lam"], config["limit"]))
+    temps_ms = (time.perf_counter() - inici) * 1000
+
+    ingressos = solucio.calcular_ingressos_servits()
+    cost_km = solucio.calcular_cost_km()
+    penalitzacio = solucio.calcular_penalitzacio_pendents()
+    km_totals = sum(solucio._calcular_km_viatge(id_camio, viatge)
+                    for id_camio, camio in enumerate(solucio.camions)
+                    for viatge in camio)
+
+    fila = dict(config)
+    fila.update({
+        "benefici": ingressos - cost_km - penalitzacio,
+        "benefici_inicial": benefici_inicial,
+        "ingressos": ingressos,
+        "cost_km_total": cost_km,
+        "penalitzacio": penalitzacio,
+        "peticions_servides": len(solucio._get_peticions_servides()),
+        "peticions_totals": len(solucio.peticions_info),
+        "km_totals": km_totals,
+        "temps_ms": temps_ms,
+    })
+    return fila
+
+
+def ids_fets(sortida: str) -> set:
+    """
+    Identificadors de les configuracions que ja són completes al CSV de sortida (buit si el fitxer no existeix).
+    Si l'última línia va quedar a mitges per una interrupció, s'elimina del fitxer.
+    """
+    if not os.path.exists(sortida):
+        return set()
+    with open(sortida, "rb+") as f:
+        contingut = f.read()
+        if contingut and not contingut.endswith(b"\n"):
+            f.truncate(contingut.rfind(b"\n") + 1)
+    with open(sortida, newline="") as f:
+        return {fila["id"] for fila in csv.DictReader(f) if fila.get("id") and fila.get(COLUMNES_RESULTAT[-1])}
+
+
+class EscriptorParquet(object):
+    """
+    Escriu files de resultats en un fitxer Parquet a mesura que arriben, en grups de mida_grup files
+    (necessita pandas i pyarrow). Com que un Parquet no es pot ampliar, en reprendre una execució
+    es torna a escriure començant per les files que ja eren al CSV.
+    """
+
+    def __init__(self, sortida_parquet: str, columnes: List[str], mida_grup: int = 64):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        enters = {"num_gasolineres", "num_centres", "multiplicitat", "seed", "n_viatges", "limit", "veins_propers",
+                  "peticions_servides", "peticions_totals"}
+        tipus = {"id": pa.string()}
+        for nom in list(PARAMETRES_PER_DEFECTE) + COLUMNES_RESULTAT:
+            if isinstance(PARAMETRES_PER_DEFECTE.get(nom), str):
+                tipus[nom] = pa.string()
+            elif isinstance(PARAMETRES_PER_DEFECTE.get(nom), bool):
+                tipus[nom] = pa.bool_()
+            else:
+                tipus[nom] = pa.int64() if nom in enters else pa.float64()
+        self.esquema = pa.schema([(nom, tipus[nom]) for nom in columnes])
+        self.columnes = columnes
+        self.mida_grup = mida_grup
+        self._pa = pa
+        self._escriptor = pq.ParquetWriter(sortida_parquet, self.esquema)
+        self._files = []
+
+    def __repr__(self):
+        return f"EscriptorParquet(columnes={len(self.columnes)}, pendents={len(self._files)})"
+
+    def afegeix_csv(self, sortida_csv: str):
+        """
+        Escriu les files completes que ja són al CSV.
+        """
+        import pandas as pd
+        # L'id és hexadecimal: sense dtype, un id només de xifres (o com '12e4') es llegiria com un nombre
+        files = pd.read_csv(sortida_csv, dtype={"id": str}).reindex(columns=self.columnes)
+        files = files[files[COLUMNES_RESULTAT[-1]].notna()]
+        for camp in self.esquema:
+            if camp.type == self._pa.int64(): # Els enters amb buits (veins_propers) es llegeixen com a reals
+                files[camp.name] = files[camp.name].astype("Int64")
+        if len(files):
+            self._escriptor.write_table(self._pa.Table.from_pandas(files, schema=self.esquema, preserve_index=False))
+
+    def escriu(self, fila: dict):
+        self._files.append({nom: fila.get(nom) for nom in self.columnes})
+        if len(self._files) >= self.mida_grup:
+            self.buida()
+
+    def buida(self):
+        if self._files:
+            self._escriptor.write_table(self._pa.Table.from_pylist(self._files, schema=self.esquema))
+            self._files = []
+
+    def tanca(self):
+        self.buida()
+        self._escriptor.close()
+
+
+def executa_experiment(graella: Dict[str, Iterable], sortida: str, processos: int = None, max_pendents: int = None,
+                       sortida_parquet: str = None, verbose: bool = True) -> int:
+    """
+    Executa totes les combinacions de la graella que encara no són a la sortida i n'afegeix els resultats al CSV
+    a mesura que acaben. Com a molt hi ha max_pendents execucions encuades alhora.
+    Si una execució falla, s'informa de l'error i es continua amb la resta; no s'escriu al CSV, de manera que
+    es torna a intentar en reprendre l'experiment.
+    :param graella: diccionari paràmetre -> llista de valors (veure PARAMETRES_PER_DEFECTE)
+    :param sortida: fitxer CSV de resultats; si ja existeix, es reprèn l'execució
+    :param processos: nombre de processos (per defecte os.cpu_count())
+    :param max_pendents: màxim d'execucions enviades i no acabades (per defecte 2 per procés)
+    :param sortida_parquet: si no és None, els resultats també s'escriuen a mesura que acaben en aquest fitxer Parquet
+    :return: nombre d'execucions fetes
+    """
+    fets = ids_fets(sortida)
+    pendents = [config for config in expandeix_graella(graella) if config["id"] not in fets]
+    processos = processos or os.cpu_count() or 1
+    max_pendents = max_pendents or 2 * processos
+    if verbose:
+        print(f"{len(pendents)} execucions pendents ({len(fets)} ja fetes a {sortida}) amb {processos} processos")
+
+    columnes = ["id"] + list(PARAMETRES_PER_DEFECTE) + COLUMNES_RESULTAT
+    escriu_capcalera = not os.path.exists(sortida) or os.path.getsize(sortida) == 0
+    if not escriu_capcalera: # En reprendre, es manté la capçalera del CSV encara que s'hi hagin afegit paràmetres
+        with open(sortida, newline="") as f:
+            columnes = next(csv.reader(f))
+    fetes = 0
+    fallades = 0
+
+    parquet = None
+    if sortida_parquet is not None:
+        parquet = EscriptorParquet(sortida_parquet, columnes)
+        if not escriu_capcalera:
+            parquet.afegeix_csv(sortida)
+
+    try:
+        with open(sortida, "a", newline="") as f, ProcessPoolExecutor(max_workers=processos) as executor:
+            escriptor = csv.DictWriter(f, fieldnames=columnes, extrasaction="ignore")
+            if escriu_capcalera:
+                escriptor.writeheader()
+                f.flush()
+
+            configs = iter(pendents)
+            en_curs = {}  # Futur -> configuració
+            while True:
+                for config in itertools.islice(configs, max_pendents - len(en_curs)):
+                    en_curs[executor.submit(executa_configuracio, config)] = config
+                if not en_curs:
+                    break
+                acabats, _ = wait(en_curs, return_when=FIRST_COMPLETED)
+                for futur in acabats:
+                    config = en_curs.pop(futur)
+                    try:
+                        fila = futur.result()
+                    except Exception as error:
+                        fallades += 1
+                        print(f"Ha fallat la configuració {config['id']} ({config['algorisme']}, seed={config['seed']}): "
+                              f"{type(error).__name__}: {error}")
+                        continue
+                    escriptor.writerow(fila)
+                    f.flush()
+                    if parquet is not None:
+                        parquet.escriu(fila)
+                    fetes += 1
+                    if verbose:
+                        print(f"[{fetes}/{len(pendents)}] {fila['algorisme']} centres={fila['num_centres']} "
+                              f"gasolineres={fila['num_gasolineres']} seed={fila['seed']} -> "
+                              f"benefici={fila['benefici']:.2f} temps={fila['temps_ms']:.0f}ms")
+    finally:
+        if parquet is not None:
+            parquet.tanca()
+    if fallades:
+        print(f"{fallades} execucions han fallat: es tornaran a intentar en reprendre l'experiment")
+    return fetes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa una graella d'experiments i en guarda els resultats en CSV")
+    parser.add_argument("graella", help="fitxer JSON amb la graella (paràmetre -> llista de valors)")
+    parser.add_argument("sortida", help="fitxer CSV de resultats (es reprèn si ja existeix)")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--parquet", default=None, help="fitxer Parquet on escriure també els resultats a mesura que acaben")
+    args = parser.parse_args()
+
+    with open(args.graella) as f:
+        graella = json.load(f)
+    executa_experiment(graella, args.sortida, processos=args.processos, sortida_parquet=args.parquet)
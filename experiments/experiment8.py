@@ -55,7 +55,6 @@ class CamionsProblemaMourePeticioOnly(CamionsProblema):
         moure_only_state.peticions_info = new_state.peticions_info
         moure_only_state.gasolinera_per_peticio = new_state.gasolinera_per_peticio
         moure_only_state.camions = new_state.camions
-        moure_only_state.peticions_servides = new_state.peticions_servides
         return moure_only_state
 
 
@@ -105,7 +104,6 @@ for i in range(NUM_EXECUCIONS):
     initial_state.peticions_info = initial_state_base.peticions_info
     initial_state.gasolinera_per_peticio = initial_state_base.gasolinera_per_peticio
     initial_state.camions = initial_state_base.camions
-    initial_state.peticions_servides = initial_state_base.peticions_servides
     
     # Crear el problema amb només mourePeticio
     problema = CamionsProblemaMourePeticioOnly(initial_state)
@@ -28,7 +28,7 @@ Y_MIN, Y_MAX = 0, 40000  # 0 .. 40000 ms
 # ---------------- Helpers per crear problema ----------------
 
 def crea_problema(seed: int, use_lazy: bool) -> CamionsProblema:
-    """Crea una instància de CamionsProblema amb estat greedy i flag per triar el generador d'accions."""
+    """Crea una instància de CamionsProblema amb estat greedy, amb tot el veïnatge o amb accions mostrejades (lazy)."""
     random.seed(seed)
 
     gas = Gasolineres(num_gasolineres=NUM_GASOLINERES, seed=seed)
@@ -44,16 +44,7 @@ def crea_problema(seed: int, use_lazy: bool) -> CamionsProblema:
     )
 
     initial_state = generate_greedy_initial_state(params)
-    problema = CamionsProblema(initial_state)
-
-    # Dins CamionsProblema.actions(state) has de mirar aquest flag:
-    # if getattr(self, "use_lazy_actions", False):
-    #     return state.generate_actions_lazy()
-    # else:
-    #     return state.generate_all_actions()
-    problema.use_lazy_actions = use_lazy
-
-    return problema
+    return CamionsProblema(initial_state, accions="mostra" if use_lazy else "totes")
 
 
 def benefici(state):
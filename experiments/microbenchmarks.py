@@ -0,0 +1,245 @@
+"""
+Microbenchmarks de les primitives de l'estat, els operadors i l'avaluació.
+
+Cada benchmark mesura una sola operació (crear un estat, copiar-lo, aplicar un mourePeticio, avaluar l'heurística,
+enumerar el veïnatge, generar un estat inicial...) sobre instàncies fixes de 100 a 5000 gasolineres, sempre amb
+les mateixes llavors, de manera que qualsevol optimització es pot comparar amb les mateixes dades.
+Cada benchmark es mesura REPETICIONS vegades de com a mínim TEMPS_MINIM segons, i la sèrie sencera s'executa diverses
+vegades (rondes), cadascuna en un procés nou, perquè el soroll entre processos (freqüència de la CPU, altres càrregues
+de la màquina) és més gran que dins d'un mateix procés. De cada benchmark es guarda el mínim de totes les repeticions
+de totes les rondes (segons per crida) i la dispersió entre rondes (màxim / mínim - 1). Els resultats es poden desar
+com a base i comparar-hi execucions posteriors: una operació es marca com a regressió si és més lenta que la base en
+més de la tolerància fixa més el soroll mesurat (la dispersió més gran de les dues), que com a molt compta SOROLL_MAXIM.
+
+Ús:
+    python -m experiments.microbenchmarks [--mides 100 500] [--benchmarks copy heuristica] [--rondes 3]
+                                          [--desa resultats.json] [--compara base.json] [--tolerancia 0.25]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from implementacio.abia_Gasolina import Gasolineres, CentresDistribucio
+from implementacio.camions_parametres import ProblemParameters
+from implementacio.camions_instancia import InstanciaProblema
+from implementacio.camions_estat import (StateRepresentation, generate_greedy_initial_state, generate_initial_state)
+
+
+MIDES = (100, 500, 1000, 2000, 5000)     # Nombre de gasolineres de cada instància
+GASOLINERES_PER_CENTRE = 10             # Com a experiment4: els centres creixen amb les gasolineres
+SEED = 1234
+BASE_PER_DEFECTE = "experiments/resultats/microbenchmarks.json"
+TOLERANCIA_PER_DEFECTE = 0.25           # Una operació és una regressió si és més d'un 25% més lenta que la base (a més del soroll)
+SOROLL_MAXIM = 0.20                     # Part màxima del marge que pot venir de la dispersió mesurada entre rondes
+RONDES = 3                              # Execucions de tota la sèrie, cadascuna en un procés nou
+TEMPS_MINIM = 0.3                       # Segons mínims de cada repetició (timeit.autorange)
+REPETICIONS = 10
+
+
+def parametres(num_gasolineres: int, seed: int = SEED) -> ProblemParameters:
+    """
+    Paràmetres de la instància de benchmark amb num_gasolineres gasolineres.
+    """
+    return ProblemParameters(km=640, n_viatges=5, valor=1000, cost_km=2,
+                             gasolineres=Gasolineres(num_gasolineres=num_gasolineres, seed=seed),
+                             centres=CentresDistribucio(num_centres=max(2, num_gasolineres // GASOLINERES_PER_CENTRE),
+                                                        multiplicitat=1, seed=seed))
+
+
+# Cada benchmark és una funció (params) -> funció sense arguments que fa l'operació a mesurar.
+# La preparació (instància, estat inicial, operador) queda fora del temps mesurat.
+
+def _estat(params) -> StateRepresentation:
+    estat = generate_greedy_initial_state(params)
+    estat.heuristica()
+    return estat
+
+
+def _bench_instancia(params):
+    return lambda: InstanciaProblema(params)
+
+
+def _bench_init(params):
+    StateRepresentation(params)  # La instància es construeix una vegada i es comparteix
+    return lambda: StateRepresentation(params)
+
+
+def _bench_copy(params):
+    return _estat(params)._copy
+
+
+def _bench_apply_action(params):
+    estat = _estat(params)
+    aleatori = random.Random(SEED)
+    accio = estat.index_veinatge().mourePeticio_aleatori(aleatori, len(estat.camions))
+    return lambda: estat.apply_action(accio)
+
+
+def _bench_heuristica(params):
+    estat = _estat(params)
+
+    def heuristica_completa():
+        estat.invalidar_caches()
+        return estat.heuristica()
+    return heuristica_completa
+
+
+def _bench_generate_all_actions(params):
+    estat = _estat(params)
+    return lambda: sum(1 for _ in estat.generate_all_actions())
+
+
+def _bench_generate_actions_lazy(params):
+    estat = _estat(params)
+
+    def lazy():
+        random.seed(SEED)
+        return sum(1 for _ in estat.generate_actions_lazy())
+    return lazy
+
+
+def _bench_greedy(params):
+    StateRepresentation(params)
+    return lambda: generate_greedy_initial_state(params)
+
+
+def _bench_ordenat(params):
+    StateRepresentation(params)
+    return lambda: generate_initial_state(params)
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "instancia": _bench_instancia,
+    "init": _bench_init,
+    "copy": _bench_copy,
+    "apply_action": _bench_apply_action,
+    "heuristica": _bench_heuristica,
+    "generate_all_actions": _bench_generate_all_actions,
+    "generate_actions_lazy": _bench_generate_actions_lazy,
+    "greedy": _bench_greedy,
+    "ordenat": _bench_ordenat,
+}
+
+
+def mesura(funcio: Callable, repeticions: int = REPETICIONS) -> float:
+    """
+    Segons per crida de funcio: el mínim de les repeticions, cadascuna de com a mínim TEMPS_MINIM segons.
+    """
+    temporitzador = timeit.Timer(funcio)
+    crides, temps = temporitzador.autorange()
+    if temps < TEMPS_MINIM:
+        crides = max(1, int(crides * TEMPS_MINIM / max(temps, 1e-9)))
+    return min(temporitzador.repeat(repeat=repeticions, number=crides)) / crides
+
+
+def _executa_ronda(mides: List[int], benchmarks: List[str]) -> Dict[str, float]:
+    """
+    Una ronda de tots els benchmarks (dins d'un procés treballador).
+    :return: {"<benchmark>/<mida>": segons per crida}
+    """
+    resultats = {}
+    for mida in mides:
+        params = parametres(mida)
+        for nom in benchmarks:
+            resultats[f"{nom}/{mida}"] = mesura(BENCHMARKS[nom](params))
+    return resultats
+
+
+def executa(mides: List[int] = MIDES, benchmarks: List[str] = None, rondes: int = RONDES, verbose: bool = True) -> dict:
+    """
+    Executa els benchmarks demanats per cada mida, rondes vegades, cada ronda en un procés nou.
+    :return: diccionari amb les metadades de l'entorn, els resultats ({"<benchmark>/<mida>": segons per crida,
+        el mínim de les rondes}) i la dispersió de cada benchmark entre rondes (màxim / mínim - 1)
+    """
+    benchmarks = benchmarks or list(BENCHMARKS)
+    desconeguts = set(benchmarks) - set(BENCHMARKS)
+    if desconeguts:
+        raise ValueError(f"Benchmarks desconeguts: {sorted(desconeguts)}. Els vàlids són {list(BENCHMARKS)}")
+    if rondes < 1:
+        raise ValueError(f"Cal com a mínim una ronda, s'han donat {rondes}")
+
+    per_ronda = []
+    for ronda in range(rondes):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            per_ronda.append(executor.submit(_executa_ronda, mides, benchmarks).result())
+        if verbose:
+            print(f"ronda {ronda + 1}/{rondes} feta")
+
+    resultats = {}
+    dispersio = {}
+    for clau in per_ronda[0]:
+        temps = [ronda[clau] for ronda in per_ronda]
+        resultats[clau] = min(temps)
+        dispersio[clau] = max(temps) / min(temps) - 1
+        if verbose:
+            print(f"{clau:32s} {resultats[clau] * 1e6:14.2f} us  (dispersió {dispersio[clau]:.0%})")
+    return {
+        "metadades": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "seed": SEED,
+            "rondes": rondes,
+        },
+        "resultats": resultats,
+        "dispersio": dispersio,
+    }
+
+
+def compara(actual: dict, base: dict, tolerancia: float = TOLERANCIA_PER_DEFECTE) -> List[str]:
+    """
+    Compara uns resultats amb la base i n'imprimeix la proporció de temps de cada benchmark. El marge de cada benchmark
+    és la tolerància més el soroll: la dispersió entre rondes més gran de la base i de l'execució actual (0 si no se
+    n'ha desat), com a molt SOROLL_MAXIM. Així un alentiment uniforme de més de tolerancia + SOROLL_MAXIM sempre es marca.
+    :return: claus dels benchmarks que són més lents que la base en més del seu marge
+    """
+    regressions = []
+    for clau, segons in actual["resultats"].items():
+        segons_base = base["resultats"].get(clau)
+        if segons_base is None:
+            print(f"{clau:32s} {'(sense base)':>14s}")
+            continue
+        soroll = max(base.get("dispersio", {}).get(clau, 0.0), actual.get("dispersio", {}).get(clau, 0.0))
+        marge = tolerancia + min(soroll, SOROLL_MAXIM)
+        proporcio = segons / segons_base
+        marca = ""
+        if proporcio > 1 + marge:
+            marca = "  REGRESSIÓ"
+            regressions.append(clau)
+        elif proporcio < 1 / (1 + marge):
+            marca = "  millora"
+        print(f"{clau:32s} {segons_base * 1e6:14.2f} us -> {segons * 1e6:14.2f} us  x{proporcio:.2f} (marge {marge:.0%}){marca}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks de les primitives de l'estat i dels operadors")
+    parser.add_argument("--mides", type=int, nargs="+", default=list(MIDES), help="nombre de gasolineres de cada instància")
+    parser.add_argument("--benchmarks", nargs="+", default=None, choices=list(BENCHMARKS))
+    parser.add_argument("--desa", default=None, help="fitxer JSON on desar els resultats (per fer-ne una base nova)")
+    parser.add_argument("--compara", nargs="?", const=BASE_PER_DEFECTE, default=None,
+                        help=f"fitxer JSON base amb què comparar (per defecte {BASE_PER_DEFECTE})")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PER_DEFECTE)
+    parser.add_argument("--rondes", type=int, default=RONDES, help="execucions de la sèrie, cadascuna en un procés nou")
+    args = parser.parse_args()
+
+    resultats = executa(args.mides, args.benchmarks, args.rondes)
+    if args.desa:
+        with open(args.desa, "w") as f:
+            json.dump(resultats, f, indent=2)
+    if args.compara:
+        with open(args.compara) as f:
+            base = json.load(f)
+        print()
+        regressions = compara(resultats, base, args.tolerancia)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
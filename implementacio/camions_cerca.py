@@ -0,0 +1,301 @@
+import math
+import random
+import time
+from typing import Callable
+
+from aima3.search import Problem
+from .camions_estat import StateRepresentation, generate_random_initial_state
+from .camions_operadors import mourePeticio, swapPeticions
+from .camions_veinatge import AvaluadorMourePeticio
+
+
+MODES_HILL_CLIMBING = ('steepest', 'first')
+INTENTS_VEI_FACTIBLE = 32 # Veïns aleatoris que prova Simulated Annealing a cada iteració abans de donar-la per perduda
+P_SWAP_PETICIONS = 0.3 # Proporció de swapPeticions entre els veïns que sorteja Simulated Annealing amb swap_peticions
+AVALUACIONS_ENTRE_RELLOTGES = 1024 # En mode 'first', veïns avaluats entre dues consultes del rellotge
+
+
+class ResultatCerca(object):
+    '''
+    Resultat d'una execució d'un algorisme de cerca local, amb les estadístiques recollides durant la cerca.
+    '''
+
+    def __init__(self):
+        self.estat = None             # Millor estat trobat
+        self.benefici = None          # Benefici del millor estat
+        self.estat_final = None       # Estat on era la cerca quan s'ha aturat (Simulated Annealing)
+        self.benefici_final = None    # Benefici de l'estat final
+        self.benefici_inicial = None  # Benefici de l'estat inicial
+        self.iteracions = 0           # Moviments aplicats, sumant tots els reinicis
+        self.avaluacions = 0          # Veïns avaluats
+        self.acceptats = 0            # Moviments acceptats amb delta negativa (Simulated Annealing)
+        self.reinicis = 0             # Reinicis fets a més de la cerca des de l'estat inicial
+        self.beneficis_reinicis = []  # Benefici final de cada cerca (la inicial i cada reinici)
+        self.temps = 0.0              # Temps total en segons
+        self.motiu_aturada = None     # 'optim_local', 'iteracions', 'temps', 'temperatura' o 'callback'
+        self.instantanies = []        # (temps, iteracions, millor benefici) cada interval_instantanies segons
+
+    def __repr__(self):
+        return (f"ResultatCerca(benefici={self.benefici}, iteracions={self.iteracions}, avaluacions={self.avaluacions}, "
+                f"reinicis={self.reinicis}, temps={self.temps:.3f}s, motiu_aturada={self.motiu_aturada})")
+
+
+def _estat_inicial(problem) -> StateRepresentation:
+    '''
+    Accepta tant un CamionsProblema com directament un StateRepresentation.
+    '''
+    return problem.initial if isinstance(problem, Problem) else problem
+
+
+def cerca_hill_climbing(problem, mode: str = 'steepest', reinicis: int = 0, generador_reinici: Callable = None,
+                        max_iteracions: int = None, temps_maxim: float = None, callback: Callable = None,
+                        seed: int = None, desempat_aima: bool = False, veins_propers: int = None,
+                        swap_peticions: bool = False, interval_instantanies: float = None) -> ResultatCerca:
+    '''
+    Hill Climbing amb l'operador mourePeticio que treballa directament sobre StateRepresentation:
+    els veïns s'avaluen amb deltes i només s'aplica (in situ) el moviment escollit.
+    És una cerca "anytime": amb max_iteracions o temps_maxim s'atura quan s'exhaureix el pressupost i retorna el millor
+    estat vist fins llavors (el millor dels reinicis acabats o l'actual, que sempre és el millor del seu reinici).
+    :param problem: CamionsProblema (s'usa el seu estat inicial) o directament un StateRepresentation; no es modifica
+    :param mode: 'steepest' (millor veí, avaluat de cop amb AvaluadorMourePeticio) o 'first' (primer veí que millora)
+    :param reinicis: nombre de reinicis aleatoris després de la cerca des de l'estat inicial (random-restart)
+    :param generador_reinici: funció (params, seed) -> StateRepresentation per generar els estats dels reinicis,
+        per defecte generate_random_initial_state
+    :param max_iteracions: nombre màxim de moviments en total (None per no limitar-los)
+    :param temps_maxim: temps màxim en segons (None per no limitar-lo); en mode 'first' també es comprova mentre es
+        recorre el veïnatge, cada AVALUACIONS_ENTRE_RELLOTGES veïns
+    :param callback: funció (iteracio, estat, benefici) cridada després de cada moviment; si retorna True la cerca s'atura
+    :param seed: llavor per generar els estats dels reinicis i per resoldre els empats en mode 'steepest';
+        sense llavor, els empats es resolen amb el generador global de random, com aima
+    :param desempat_aima: en mode 'steepest', resol els empats igual que aima3.search.hill_climbing (veure AvaluadorMourePeticio)
+    :param veins_propers: si no és None, cada petició només es mou als veins_propers camions més propers (llista de candidats)
+    :param swap_peticions: si és cert, el veïnatge també inclou swapPeticions (després de mourePeticio en mode 'first')
+    :param interval_instantanies: si no és None, cada tants segons es guarda (temps, iteracions, millor benefici)
+        a resultat.instantanies
+    :return: ResultatCerca amb el millor estat trobat
+    '''
+    if mode not in MODES_HILL_CLIMBING:
+        raise ValueError(f"Mode de Hill Climbing desconegut: {mode}. Els modes vàlids són {MODES_HILL_CLIMBING}")
+
+    estat_inicial = _estat_inicial(problem)
+    generador_reinici = generador_reinici or generate_random_initial_state
+    aleatori = random.Random(seed)
+    desempat = aleatori if seed is not None else None
+    avaluador = AvaluadorMourePeticio(estat_inicial, veins_propers) if mode == 'steepest' else None
+
+    resultat = ResultatCerca()
+    resultat.benefici_inicial = -estat_inicial.heuristica()
+    inici = time.perf_counter()
+    propera_instantania = interval_instantanies
+
+    def temps_exhaurit() -> bool:
+        return temps_maxim is not None and time.perf_counter() - inici >= temps_maxim
+
+    for reinici in range(reinicis + 1):
+        if reinici == 0:
+            estat = estat_inicial._copy()
+        else:
+            estat = generador_reinici(estat_inicial.params, aleatori.randrange(2 ** 32))
+            resultat.reinicis += 1
+        benefici = -estat.heuristica()
+
+        while True:
+            if max_iteracions is not None and resultat.iteracions >= max_iteracions:
+                resultat.motiu_aturada = 'iteracions'
+                break
+            if temps_exhaurit():
+                resultat.motiu_aturada = 'temps'
+                break
+            temps = time.perf_counter() - inici if propera_instantania is not None else None
+            if temps is not None and temps >= propera_instantania:
+                millor = benefici if resultat.benefici is None else max(benefici, resultat.benefici)
+                resultat.instantanies.append((temps, resultat.iteracions, millor))
+                propera_instantania = temps + interval_instantanies
+
+            if mode == 'steepest':
+                accio, delta = avaluador.millor_accio(estat, desempat_aima, desempat)
+                resultat.avaluacions += avaluador.ultim_nombre_veins
+                if swap_peticions:
+                    for swap, delta_swap in estat.millors_swapPeticions(1, veins_propers):
+                        if accio is None or delta_swap > delta:
+                            accio, delta = swap, delta_swap
+            else:
+                accio, delta = None, None
+                exhaurit = False
+                for id_peticio, camio_origen, camio_desti, delta_vei in estat.deltes_mourePeticio(veins_propers):
+                    resultat.avaluacions += 1
+                    if delta_vei > 0:
+                        accio, delta = (id_peticio, camio_origen, camio_desti), delta_vei
+                        break
+                    if resultat.avaluacions % AVALUACIONS_ENTRE_RELLOTGES == 0 and temps_exhaurit():
+                        exhaurit = True
+                        break
+                if accio is not None:
+                    accio = mourePeticio(*accio)
+                elif swap_peticions and not exhaurit:
+                    for *swap, delta_swap in estat.deltes_swapPeticions(veins_propers):
+                        resultat.avaluacions += 1
+                        if delta_swap > 0:
+                            accio, delta = swapPeticions(*swap), delta_swap
+                            break
+                        if resultat.avaluacions % AVALUACIONS_ENTRE_RELLOTGES == 0 and temps_exhaurit():
+                            exhaurit = True
+                            break
+                if exhaurit:
+                    resultat.motiu_aturada = 'temps'
+                    break
+
+            if accio is None or delta <= 0:
+                resultat.motiu_aturada = 'optim_local'
+                break
+
+            estat.aplicar_in_situ(accio)
+            benefici = -estat.heuristica()
+            resultat.iteracions += 1
+            if callback is not None and callback(resultat.iteracions, estat, benefici):
+                resultat.motiu_aturada = 'callback'
+                break
+
+        resultat.beneficis_reinicis.append(benefici)
+        if resultat.benefici is None or benefici > resultat.benefici:
+            resultat.estat = estat
+            resultat.benefici = benefici
+        if resultat.motiu_aturada != 'optim_local': # S'ha exhaurit el pressupost: no es fan més reinicis
+            break
+
+    resultat.estat_final = estat
+    resultat.benefici_final = benefici
+    resultat.temps = time.perf_counter() - inici
+    return resultat
+
+
+def hill_climbing_vectoritzat(problem, max_iteracions: int = None, temps_maxim: float = None) -> StateRepresentation:
+    '''
+    Hill Climbing de màxim pendent amb l'operador mourePeticio, equivalent a aima3.search.hill_climbing
+    però avaluant tot el veïnatge de cop amb AvaluadorMourePeticio. Només es crea l'estat del moviment guanyador.
+    :param problem: CamionsProblema (s'usa el seu estat inicial) o directament un StateRepresentation
+    :param max_iteracions: nombre màxim de moviments (None per no limitar-los)
+    :param temps_maxim: temps màxim en segons (None per no limitar-lo)
+    :return: estat final, on cap veí millora el benefici (o el millor trobat si s'exhaureix el pressupost)
+    '''
+    return cerca_hill_climbing(problem, mode='steepest', max_iteracions=max_iteracions, temps_maxim=temps_maxim).estat
+
+
+def exp_schedule(k: float = 20, lam: float = 0.005, limit: int = 100) -> Callable[[int], float]:
+    '''
+    Mateix esquema de temperatura que aima3.search.exp_schedule: T(t) = k * e^(-lam * t) mentre t < limit, i 0 després.
+    '''
+    return lambda t: (k * math.exp(-lam * t) if t < limit else 0)
+
+
+def exp_schedule_temps(temps_maxim: float, k: float = 20, temperatura_final: float = 1.0) -> Callable[[int], float]:
+    '''
+    Esquema exponencial en funció del temps de rellotge en lloc de les iteracions: T = k * (temperatura_final / k) ^ (s / temps_maxim),
+    on s són els segons des de la primera crida. El refredament ocupa tot el pressupost de temps sigui quin sigui
+    el ritme d'iteracions (amb exp_schedule, un lam fix arriba a 0 al cap d'un nombre fix d'iteracions). No retorna mai 0:
+    la cerca l'ha d'aturar amb temps_maxim.
+    '''
+    inici = []
+
+    def temperatura(t: int) -> float:
+        if not inici:
+            inici.append(time.perf_counter())
+        return k * (temperatura_final / k) ** ((time.perf_counter() - inici[0]) / temps_maxim)
+    return temperatura
+
+
+def cerca_simulated_annealing(problem, schedule: Callable[[int], float] = None, k: float = 20, lam: float = 0.005,
+                              limit: int = 100, seed: int = None, callback: Callable = None, max_iteracions: int = None,
+                              temps_maxim: float = None, interval_instantanies: float = None, veins_propers: int = None,
+                              swap_peticions: bool = False) -> ResultatCerca:
+    '''
+    Simulated Annealing amb l'operador mourePeticio (i swapPeticions si es demana), equivalent a aima3.search.simulated_annealing però sense
+    generar tot el veïnatge a cada pas: el veí s'escull uniformement en temps constant amb l'índex de veïnatge de l'estat,
+    s'avalua amb delta_benefici i, si s'accepta, s'aplica in situ. El cost d'una iteració no depèn de la mida de la instància.
+    Els veïns que no respecten el límit de km es descarten i se n'escull un altre (veure StateRepresentation.es_factible).
+    És una cerca "anytime": es guarda el millor estat vist, que és el que es retorna, i amb max_iteracions o temps_maxim
+    s'atura quan s'exhaureix el pressupost. El millor estat només es copia quan la cerca n'accepta un moviment que empitjora.
+    :param problem: CamionsProblema (s'usa el seu estat inicial) o directament un StateRepresentation; no es modifica
+    :param schedule: funció t -> temperatura; la cerca acaba quan retorna 0. Per defecte exp_schedule(k, lam, limit)
+    :param k, lam, limit: paràmetres de exp_schedule si no es dona schedule
+    :param seed: llavor del generador aleatori de la cerca
+    :param callback: funció (iteracio, estat, benefici) cridada després de cada iteració; si retorna True la cerca s'atura
+    :param max_iteracions: nombre màxim de passos t (None per no limitar-los)
+    :param temps_maxim: temps màxim en segons (None per no limitar-lo)
+    :param interval_instantanies: si no és None, cada tants segons es guarda (temps, iteracions, millor benefici)
+        a resultat.instantanies
+    :param veins_propers: si no és None, els veïns es limiten als camions més propers, com a cerca_hill_climbing
+    :param swap_peticions: si és cert, una proporció P_SWAP_PETICIONS dels veïns sortejats són swapPeticions
+    :return: ResultatCerca amb el millor estat vist a estat i, a estat_final, l'estat actual quan s'atura la cerca
+        (el que retornaria aima)
+    '''
+    schedule = schedule or exp_schedule(k, lam, limit)
+    aleatori = random.Random(seed)
+
+    estat = _estat_inicial(problem)._copy()
+    benefici = -estat.heuristica()
+    index = estat.index_veinatge()
+    num_camions = len(estat.camions)
+
+    resultat = ResultatCerca()
+    resultat.benefici_inicial = benefici
+    inici = time.perf_counter()
+    comprova_rellotge = temps_maxim is not None or interval_instantanies is not None
+    propera_instantania = interval_instantanies
+
+    millor_benefici = benefici
+    millor_estat = None  # None mentre l'estat actual és el millor vist
+    t = 0
+    while True:
+        if max_iteracions is not None and t >= max_iteracions:
+            resultat.motiu_aturada = 'iteracions'
+            break
+        if comprova_rellotge:
+            temps = time.perf_counter() - inici
+            if temps_maxim is not None and temps >= temps_maxim:
+                resultat.motiu_aturada = 'temps'
+                break
+            if propera_instantania is not None and temps >= propera_instantania:
+                resultat.instantanies.append((temps, resultat.iteracions, millor_benefici))
+                propera_instantania = temps + interval_instantanies
+
+        temperatura = schedule(t)
+        if temperatura == 0:
+            resultat.motiu_aturada = 'temperatura'
+            break
+        if not index.peticions or num_camions < 2: # Sense cap petició servida no hi ha cap veí
+            resultat.motiu_aturada = 'optim_local'
+            break
+        for _ in range(INTENTS_VEI_FACTIBLE): # Els veïns que passen del límit de km no formen part del veïnatge
+            if swap_peticions and aleatori.random() < P_SWAP_PETICIONS:
+                accio = index.swapPeticions_aleatori(estat, aleatori, veins_propers)
+            else:
+                accio = index.mourePeticio_aleatori(aleatori, num_camions, estat, veins_propers)
+            delta = estat.delta_si_factible(accio) if accio is not None else None
+            if delta is not None:
+                break
+        if delta is not None: # Si cap intent és factible, el pas es perd però compta com a iteració
+            resultat.avaluacions += 1
+            if delta > 0 or math.exp(delta / temperatura) > aleatori.uniform(0, 1):
+                if delta < 0 and millor_estat is None: # Es deixa el millor estat vist: se'n guarda una còpia
+                    millor_estat = estat._copy()
+                estat.aplicar_in_situ(accio)
+                benefici += delta
+                resultat.iteracions += 1
+                if delta <= 0:
+                    resultat.acceptats += 1
+                if benefici > millor_benefici:
+                    millor_benefici = benefici
+                    millor_estat = None
+
+        t += 1
+        if callback is not None and callback(t, estat, benefici):
+            resultat.motiu_aturada = 'callback'
+            break
+
+    resultat.estat_final = estat
+    resultat.benefici_final = -estat.heuristica()
+    resultat.estat = estat if millor_estat is None else millor_estat
+    resultat.benefici = -resultat.estat.heuristica()
+    resultat.temps = time.perf_counter() - inici
+    return resultat
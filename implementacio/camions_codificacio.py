@@ -0,0 +1,87 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .camions_estat import StateRepresentation
+
+
+class InstantaniaViatges(object):
+    '''
+    Instantània compacta i de només lectura de l'assignació de viatges d'un estat, per enviar-la entre processos
+    o desar-la: un array int32 de forma fixa (camions x n_viatges x 2) amb els ids de les peticions de cada viatge
+    i -1 als llocs buits. Els viatges de cada camió ocupen les primeres files en el mateix ordre que a
+    StateRepresentation.camions. L'índex invers petició -> lloc (camió, viatge, posició) respon en temps constant,
+    però només sobre la instantània: la cerca no la fa servir, treballa sobre StateRepresentation.
+    '''
+
+    def __init__(self, viatges: np.ndarray, num_peticions: int):
+        '''
+        :param viatges: array int32 (camions x n_viatges x 2), -1 als llocs buits
+        :param num_peticions: nombre total de peticions de la instància
+        '''
+        self.viatges = viatges
+        self.num_peticions = num_peticions
+        self._lloc = None # Índex invers (num_peticions x 3), es construeix la primera vegada que cal
+
+    @classmethod
+    def de_camions(cls, camions: List[List[List[int]]], n_viatges: int, num_peticions: int) -> 'InstantaniaViatges':
+        '''
+        Codifica una llista de viatges per camió (el format de StateRepresentation.camions).
+        '''
+        viatges = np.full((len(camions), n_viatges, 2), -1, dtype=np.int32)
+        for id_camio, camio in enumerate(camions):
+            if len(camio) > n_viatges:
+                raise ValueError(f"El camió {id_camio} té {len(camio)} viatges i el màxim és {n_viatges}")
+            for id_viatge, viatge in enumerate(camio):
+                if len(viatge) > 2:
+                    raise ValueError(f"El viatge {id_viatge} del camió {id_camio} té més de 2 peticions")
+                viatges[id_camio, id_viatge, :len(viatge)] = viatge
+        return cls(viatges, num_peticions)
+
+    @classmethod
+    def d_estat(cls, estat: StateRepresentation) -> 'InstantaniaViatges':
+        '''
+        Codifica l'assignació de viatges d'un estat.
+        '''
+        return cls.de_camions(estat.camions, estat.params.n_viatges, len(estat.peticions_info))
+
+    def a_estat(self, params) -> StateRepresentation:
+        '''
+        Reconstrueix un StateRepresentation amb aquesta assignació de viatges.
+        '''
+        estat = StateRepresentation(params)
+        estat.camions = self.camions
+        return estat
+
+    @property
+    def camions(self) -> List[List[List[int]]]:
+        '''
+        Vista en el format de llistes de StateRepresentation.camions (una llista nova a cada crida).
+        '''
+        return [[[p for p in viatge if p >= 0] for viatge in camio if viatge[0] >= 0 or viatge[1] >= 0]
+                for camio in self.viatges.tolist()]
+
+    def copy(self) -> 'InstantaniaViatges':
+        return InstantaniaViatges(self.viatges.copy(), self.num_peticions)
+
+    def _index_invers(self) -> np.ndarray:
+        if self._lloc is None:
+            self._lloc = np.full((self.num_peticions, 3), -1, dtype=np.int32)
+            camions, viatges, posicions = np.nonzero(self.viatges >= 0)
+            self._lloc[self.viatges[camions, viatges, posicions]] = np.stack([camions, viatges, posicions], axis=1)
+        return self._lloc
+
+    def lloc(self, id_peticio: int) -> Optional[Tuple[int, int, int]]:
+        '''
+        Camió, viatge i posició dins del viatge on és la petició, o None si no és servida.
+        '''
+        camio, viatge, posicio = self._index_invers()[id_peticio].tolist()
+        return None if camio < 0 else (camio, viatge, posicio)
+
+    def es_servida(self, id_peticio: int) -> bool:
+        return self._index_invers()[id_peticio, 0] >= 0
+
+    def __eq__(self, other):
+        return isinstance(other, InstantaniaViatges) and np.array_equal(self.viatges, other.viatges)
+
+    def __repr__(self):
+        return f"InstantaniaViatges(camions={self.viatges.shape[0]}, n_viatges={self.viatges.shape[1]}, servides={int((self.viatges >= 0).sum())})"
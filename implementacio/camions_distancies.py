@@ -0,0 +1,88 @@
+from typing import Sequence, Tuple
+import numpy as np
+
+
+# Per sobre d'aquest nombre de gasolineres no es guarda la matriu gasolinera-gasolinera sencera
+# (amb 10.000 gasolineres serien 200 MB) i la distància entre gasolineres es calcula a partir de les coordenades.
+MAX_GASOLINERES_MATRIU = 2000
+
+
+class DistanciesManhattan(object):
+    '''
+    Distàncies Manhattan precalculades entre centres i gasolineres d'una instància.
+    - centre_gasolinera: matriu numpy (camions x gasolineres) amb la distància del centre de cada camió a cada gasolinera
+    - gasolinera_gasolinera: matriu numpy (gasolineres x gasolineres), o None si la instància és massa gran
+    Les consultes d'una sola distància es fan sobre còpies en llistes de Python, que són més ràpides d'indexar
+    element a element que els arrays de numpy.
+    '''
+
+    def __init__(self, coords_centres: Sequence[Tuple[int, int]], coords_gasolineres: Sequence[Tuple[int, int]]):
+        centres = np.array(coords_centres, dtype=np.int32).reshape(-1, 2)
+        gasolineres = np.array(coords_gasolineres, dtype=np.int32).reshape(-1, 2)
+        dtype = np.int16 if self._cap_en_int16(centres, gasolineres) else np.int32
+
+        self.coords_centres = centres
+        self.coords_gasolineres = gasolineres
+        self.centre_gasolinera = self._matriu_manhattan(centres, gasolineres).astype(dtype)
+        self._centre_gasolinera = self.centre_gasolinera.tolist()
+
+        if len(gasolineres) <= MAX_GASOLINERES_MATRIU:
+            self.gasolinera_gasolinera = self._matriu_manhattan(gasolineres, gasolineres).astype(dtype)
+            self._gasolinera_gasolinera = self.gasolinera_gasolinera.tolist()
+        else:
+            self.gasolinera_gasolinera = None
+            self._gasolinera_gasolinera = None
+            self._coords_gasolineres = [tuple(c) for c in gasolineres.tolist()]
+
+    @staticmethod
+    def _matriu_manhattan(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.abs(a[:, None, 0] - b[None, :, 0]) + np.abs(a[:, None, 1] - b[None, :, 1])
+
+    @staticmethod
+    def _cap_en_int16(centres: np.ndarray, gasolineres: np.ndarray) -> bool:
+        '''
+        Cert si qualsevol distància entre aquestes coordenades cap en un int16 (a la graella 0-99 sempre).
+        '''
+        tots = np.vstack([centres, gasolineres])
+        return len(tots) == 0 or int(np.ptp(tots, axis=0).sum()) <= np.iinfo(np.int16).max
+
+    def centre_a_gasolinera(self, id_camio: int, id_gasolinera: int) -> int:
+        '''
+        Distància entre el centre del camió i la gasolinera
+        '''
+        return self._centre_gasolinera[id_camio][id_gasolinera]
+
+    def entre_gasolineres(self, id_gasolinera1: int, id_gasolinera2: int) -> int:
+        '''
+        Distància entre dues gasolineres
+        '''
+        if self._gasolinera_gasolinera is not None:
+            return self._gasolinera_gasolinera[id_gasolinera1][id_gasolinera2]
+        c1 = self._coords_gasolineres[id_gasolinera1]
+        c2 = self._coords_gasolineres[id_gasolinera2]
+        return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1])
+
+    def entre_gasolineres_array(self, ids1: np.ndarray, ids2: np.ndarray) -> np.ndarray:
+        '''
+        Versió vectoritzada de entre_gasolineres: distàncies element a element (amb broadcasting) entre dos arrays d'ids.
+        '''
+        if self.gasolinera_gasolinera is not None:
+            return self.gasolinera_gasolinera[ids1, ids2]
+        c1 = self.coords_gasolineres[ids1]
+        c2 = self.coords_gasolineres[ids2]
+        return np.abs(c1[..., 0] - c2[..., 0]) + np.abs(c1[..., 1] - c2[..., 1])
+
+    def km_ruta(self, id_camio: int, gasolineres: Sequence[int]) -> int:
+        '''
+        Km d'una ruta que surt del centre del camió, visita les gasolineres en ordre i torna al centre.
+        '''
+        fila_centre = self._centre_gasolinera[id_camio]
+        n = len(gasolineres)
+        if n == 0:
+            return 0
+        if n == 1:
+            return 2 * fila_centre[gasolineres[0]]
+        km = fila_centre[gasolineres[0]] + fila_centre[gasolineres[-1]]
+        for i in range(1, n):
+            km += self.entre_gasolineres(gasolineres[i - 1], gasolineres[i])
+        return km
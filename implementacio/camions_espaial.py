@@ -0,0 +1,77 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+
+class IndexEspaial(object):
+    '''
+    Índex espacial de graella (cubetes quadrades) sobre punts amb coordenades enteres, per trobar
+    els k punts més propers a una posició amb distància Manhattan sense recórrer-los tots.
+    Només es miren les cubetes en anells concèntrics al voltant de la posició fins que cap punt
+    d'un anell més llunyà pot ser més proper que els k ja trobats.
+    '''
+
+    def __init__(self, coords: Sequence[Tuple[int, int]], mida_cella: int = None):
+        '''
+        :param coords: coordenades (x, y) de cada punt; l'id d'un punt és la seva posició a la llista
+        :param mida_cella: costat de cada cubeta; per defecte, el que dona aproximadament un punt per cubeta
+        '''
+        self.coords = [(int(x), int(y)) for x, y in coords]
+        if not self.coords:
+            raise ValueError("L'índex espacial necessita com a mínim un punt")
+        xs = [x for x, _ in self.coords]
+        ys = [y for _, y in self.coords]
+        self.x_min, self.y_min = min(xs), min(ys)
+        if mida_cella is None:
+            area = (max(xs) - self.x_min + 1) * (max(ys) - self.y_min + 1)
+            mida_cella = max(1, math.ceil(math.sqrt(area / len(self.coords))))
+        self.mida_cella = mida_cella
+        self.num_celles_x = (max(xs) - self.x_min) // mida_cella + 1
+        self.num_celles_y = (max(ys) - self.y_min) // mida_cella + 1
+
+        self.celles: Dict[Tuple[int, int], List[int]] = {}
+        for id_punt, (x, y) in enumerate(self.coords):
+            self.celles.setdefault(self._cella(x, y), []).append(id_punt)
+
+    def _cella(self, x: int, y: int) -> Tuple[int, int]:
+        return (x - self.x_min) // self.mida_cella, (y - self.y_min) // self.mida_cella
+
+    def mes_propers(self, x: int, y: int, k: int) -> List[int]:
+        '''
+        Els k punts més propers a (x, y) amb distància Manhattan, de més a menys proper (els empats per id).
+        :return: llista d'ids (tots els punts si n'hi ha menys de k)
+        '''
+        k = min(k, len(self.coords))
+        cx, cy = self._cella(x, y)
+        # Anells que cal mirar com a màxim per cobrir tota la graella des de la cubeta de (x, y)
+        max_anell = max(abs(cx), abs(cy), abs(self.num_celles_x - 1 - cx), abs(self.num_celles_y - 1 - cy))
+
+        trobats = []
+        for anell in range(max_anell + 1):
+            for cella in self._anell(cx, cy, anell):
+                for id_punt in self.celles.get(cella, ()):
+                    px, py = self.coords[id_punt]
+                    trobats.append((abs(px - x) + abs(py - y), id_punt))
+            # Qualsevol punt d'un anell més llunyà és a distància més gran que anell * mida_cella
+            if len(trobats) >= k:
+                trobats.sort()
+                if trobats[k - 1][0] <= anell * self.mida_cella:
+                    break
+        trobats.sort()
+        return [id_punt for _, id_punt in trobats[:k]]
+
+    def _anell(self, cx: int, cy: int, anell: int):
+        '''
+        Cubetes a distància de Chebyshev exactament anell de la cubeta (cx, cy).
+        '''
+        if anell == 0:
+            yield cx, cy
+            return
+        for dx in range(-anell, anell + 1):
+            yield cx + dx, cy - anell
+            yield cx + dx, cy + anell
+        for dy in range(-anell + 1, anell):
+            yield cx - anell, cy + dy
+            yield cx + anell, cy + dy
+
+    def __repr__(self):
+        return f"IndexEspaial(punts={len(self.coords)}, mida_cella={self.mida_cella}, celles={len(self.celles)})"
@@ -1,9 +1,16 @@
 from .camions_parametres import ProblemParameters
 from .camions_operadors import CamionsOperator
-from typing import List, Set, Generator
+from typing import List, Set, Generator, Tuple
 from .abia_Gasolina import Gasolineres, Gasolinera
 from .camions_operadors import swapCentres, mourePeticio, swapPeticions
+from .camions_instancia import instancia_de, factor_de_preu
+from .camions_index import IndexVeinatge, font_uniforme
+import heapq
 import random
+import numpy as np
+
+
+VEINS_PROPERS_REGRET = 10 # Camions candidats de cada petició a generate_regret_initial_state
 
 
 class StateRepresentation(object):
@@ -12,24 +19,32 @@ class StateRepresentation(object):
         '''
         Representació de l'estat del problema de camions, amb les següents propietats:
         - params: objecte ProblemParameters amb les dades del problema
+        - instancia: InstanciaProblema amb les dades fixes (peticions, gasolineres i coordenades), compartida entre estats
         - camions: llista de llistes de viatges per camió, on cada viatge és una llista de peticions ateses
         '''
         self.params = params
+        self.instancia = instancia_de(params) # Dades fixes de la instància, compartides per tots els estats
 
-        self.peticions_info = [] # dies pendents per cada petició, el índex de la llista indica el id de la petició, el valor associat a l'índex indica els dies que porta pendent la petició
-        self.gasolinera_per_peticio = [] # gasolinera associada a cada petició, el índex de la llista indica el id de la petició, el valor de la llista indica la gasolinera associada
-        
-        i_global = 0
-        for id_gas, gasolinera in enumerate(params.gasolineres.gasolineres): # Recorrem la llista de gasolineres retornant parelles, el índex i el objecte
-            for dies in gasolinera.peticions: # Per cada gasolinera, iterem sobre totes les seves peticions pendents
-                self.peticions_info.append(dies) # Afegim els dies pendents de la petició a la llista
-                self.gasolinera_per_peticio.append(id_gas) # Afegim la gasolinera associada a la petició
-                i_global += 1 # Incrementem el comptador global de peticions
+        self.peticions_info = self.instancia.peticions_info # dies pendents per cada petició, el índex de la llista indica el id de la petició, el valor associat a l'índex indica els dies que porta pendent la petició
+        self.gasolinera_per_peticio = self.instancia.gasolinera_per_peticio # gasolinera associada a cada petició, el índex de la llista indica el id de la petició, el valor de la llista indica la gasolinera associada
         
-        num_camions = len(params.centres.centres)
+        num_camions = self.instancia.num_camions
         self.camions = [[] for _ in range(num_camions)]  # Els índex de la primera llista són cada camió, les subllistes indiquen les peticions que ha de servir cada camió
 
-        self.peticions_servides = set()
+        self._benefici = None # Benefici de l'estat, es calcula la primera vegada i després s'actualitza amb deltes
+        self._index = None # IndexVeinatge de les peticions servides, es construeix la primera vegada que cal
+        self._index_pare = None # (estat pare, índex del pare, versió de l'índex, operador) per heretar-lo (veure apply_action)
+        self._servides = None # bytearray amb un 1 per cada petició servida, es construeix la primera vegada que cal
+        self._penalitzacio = None # Penalització total de les peticions pendents, es manté juntament amb _servides
+        self._km = None # Km totals de cada camió, es calculen la primera vegada que cal i aplicar_in_situ els manté
+        self._propis = None # Després d'una còpia, bytearray amb un 1 pels camions que l'estat ja no comparteix (None: tots són propis)
+
+    @property
+    def peticions_servides(self) -> Set[int]:
+        """
+        Conjunt de les peticions servides, a partir del registre que manté l'estat.
+        """
+        return self._get_peticions_servides()
 
     def heuristica(self) -> float:
         """
@@ -40,33 +55,414 @@ class StateRepresentation(object):
         - Pen = Penalització per peticions no servides avui
         
         Retorna: -B_total (per minimitzar, que equival a maximitzar B_total)
+        El valor es guarda a l'estat: els estats generats amb apply_action el reben ja calculat amb delta_benefici.
         """
-        ingressos = self.calcular_ingressos_servits()
-        cost_km = self.calcular_cost_km()
-        penalitzacio = self.calcular_penalitzacio_pendents()
-    
-        benefici_total = ingressos - cost_km - penalitzacio
+        if self._benefici is None:
+            ingressos = self.calcular_ingressos_servits()
+            cost_km = self.calcular_cost_km()
+            penalitzacio = self.calcular_penalitzacio_pendents()
+        
+            self._benefici = ingressos - cost_km - penalitzacio
     
-        return -benefici_total  # ha de ser negatiu
+        return -self._benefici  # ha de ser negatiu
+
+    def invalidar_caches(self):
+        """
+        Oblida els valors calculats de l'estat. Cal cridar-la si es modifica self.camions directament
+        després d'haver avaluat l'estat.
+        """
+        self._benefici = None
+        self._index = None
+        self._index_pare = None
+        self._servides = None
+        self._penalitzacio = None
+        self._km = None
+
+    def _km_camions(self) -> List[float]:
+        """
+        Km totals que recorre cada camió. Es calculen la primera vegada i aplicar_in_situ els manté actualitzats.
+        """
+        if self._km is None:
+            self._km = [sum(self._calcular_km_viatge(id_camio, viatge) for viatge in camio)
+                        for id_camio, camio in enumerate(self.camions)]
+        return self._km
+
+    def km_camio(self, id_camio: int) -> float:
+        return self._km_camions()[id_camio]
+
+    def limit_km(self):
+        """
+        Màxim de km per camió (params.km), o None si els paràmetres no en tenen.
+        """
+        return getattr(self.params, 'km', None)
+
+    def es_factible(self, action: CamionsOperator = None) -> bool:
+        """
+        Comprova el límit de km per camió.
+        Sense operador, diu si tots els camions de l'estat el respecten. Amb un operador, diu si l'operador el respecta:
+        cap camió a qui l'operador afegeix km pot acabar per sobre del límit (treure km sempre es pot, de manera que
+        un estat inicial que no el compleix es pot anar reparant). Amb els km de cada camió mantinguts, és O(1) per mourePeticio.
+        """
+        limit = self.limit_km()
+        if limit is None:
+            return True
+        km = self._km_camions()
+        if action is None:
+            return all(km_camio <= limit for km_camio in km)
+
+        if isinstance(action, mourePeticio):
+            deltes_km = self._km_mourePeticio(action)
+            return deltes_km is None or self._dins_limit_km(action, deltes_km, limit)
+        elif isinstance(action, swapCentres):
+            km1, km2 = self._km_swapCentres(action)
+            return ((km1 <= km[action.centre1] or km1 <= limit) and
+                    (km2 <= km[action.centre2] or km2 <= limit))
+        elif isinstance(action, swapPeticions):
+            deltes_km = self._km_swapPeticions(action)
+            if deltes_km is None:
+                return True
+            delta1, delta2 = deltes_km
+            return ((delta1 <= 0 or km[action.camio1] + delta1 <= limit) and
+                    (delta2 <= 0 or km[action.camio2] + delta2 <= limit))
+        return True
+
+    def _dins_limit_km(self, action: mourePeticio, deltes_km, limit) -> bool:
+        delta_origen, delta_desti, _ = deltes_km
+        if action.camio_origen == action.camio_desti:
+            delta_desti += delta_origen
+        return delta_desti <= 0 or self._km_camions()[action.camio_desti] + delta_desti <= limit
+
+    def delta_si_factible(self, action: CamionsOperator):
+        """
+        Com delta_benefici, però retorna None si l'operador no respecta el límit de km (veure es_factible).
+        Per mourePeticio els km es calculen una sola vegada per les dues coses.
+        """
+        limit = self.limit_km()
+        if limit is not None and isinstance(action, mourePeticio):
+            deltes_km = self._km_mourePeticio(action)
+            if deltes_km is not None:
+                if not self._dins_limit_km(action, deltes_km, limit):
+                    return None
+                return self._delta_de_km(action, deltes_km)
+        elif not self.es_factible(action):
+            return None
+        return self.delta_benefici(action)
+
+    def _seguiment_servides(self) -> bytearray:
+        """
+        Registre de peticions servides (un byte per petició) i penalització de les pendents. Es construeix
+        recorrent els viatges la primera vegada i aplicar_in_situ el manté actualitzat.
+        """
+        if self._servides is None:
+            servides = bytearray(len(self.peticions_info))
+            for camio in self.camions:
+                for viatge in camio:
+                    for i_peticio in viatge:
+                        servides[i_peticio] = 1
+            self._penalitzacio = sum(self._penalitzacio_peticio(i) for i in range(len(servides)) if not servides[i])
+            self._servides = servides
+        return self._servides
+
+    def es_servida(self, i_peticio: int) -> bool:
+        return self._seguiment_servides()[i_peticio] == 1
+
+    def index_veinatge(self) -> IndexVeinatge:
+        """
+        Índex de les peticions servides (camió i viatge de cadascuna). Es construeix la primera vegada
+        i aplicar_in_situ el manté actualitzat. Un estat creat amb apply_action(hereta_index=True) pren l'índex
+        del seu pare i l'actualitza amb l'operador, si el pare encara el té i no ha canviat des de llavors.
+        """
+        if self._index is None:
+            if self._index_pare is not None:
+                pare, index, versio, accio = self._index_pare
+                if pare._index is index and index.versio == versio:
+                    pare._index = None # Ara l'índex és del fill: si el pare el torna a necessitar, el reconstrueix
+                    index.actualitza(self, accio)
+                    self._index = index
+            self._index_pare = None
+            if self._index is None:
+                self._index = IndexVeinatge(self)
+        return self._index
+
+    def delta_benefici(self, action: CamionsOperator) -> float:
+        """
+        Canvi exacte del benefici (B_total) que produiria aplicar l'operador a l'estat actual, sense crear cap estat nou.
+        :param action: operador a avaluar
+        :return: B_total(estat després d'aplicar action) - B_total(estat actual)
+        """
+        delta = self._delta(action)
+        if delta is None: # Operadors sense delta: avaluació completa
+            return self.heuristica() - self.apply_action(action).heuristica()
+        return delta
+
+    def _delta(self, action: CamionsOperator):
+        """
+        Delta incremental de l'operador, o None si no es pot calcular sense aplicar-lo.
+        """
+        if isinstance(action, mourePeticio):
+            return self._delta_mourePeticio(action)
+        elif isinstance(action, swapCentres):
+            return self._delta_swapCentres(action)
+        elif isinstance(action, swapPeticions):
+            deltes_km = self._km_swapPeticions(action)
+            return -sum(deltes_km) * self.params.cost_km if deltes_km is not None else None
+        return None
+
+    def _viatges_swapPeticions(self, action: swapPeticions):
+        """
+        Viatges de les dues peticions de swapPeticions, o None si alguna no és al seu camió o són al mateix viatge.
+        """
+        if action.camio1 == action.camio2:
+            return None
+        viatge1 = next((v for v in self.camions[action.camio1] if action.id_peticio1 in v), None)
+        viatge2 = next((v for v in self.camions[action.camio2] if action.id_peticio2 in v), None)
+        if viatge1 is None or viatge2 is None:
+            return None
+        return viatge1, viatge2
+
+    def _km_swapPeticions(self, action: swapPeticions):
+        """
+        Canvi de km dels dos camions de swapPeticions: cada petició ocupa el lloc de l'altra al seu viatge.
+        Les peticions servides no canvien, de manera que la delta de benefici només depèn dels km.
+        :return: (delta km camio1, delta km camio2), o None si l'operador no es pot aplicar
+        """
+        viatges = self._viatges_swapPeticions(action)
+        if viatges is None:
+            return None
+        viatge1, viatge2 = viatges
+        nou1 = [action.id_peticio2 if p == action.id_peticio1 else p for p in viatge1]
+        nou2 = [action.id_peticio1 if p == action.id_peticio2 else p for p in viatge2]
+        return (self._calcular_km_viatge(action.camio1, nou1) - self._calcular_km_viatge(action.camio1, viatge1),
+                self._calcular_km_viatge(action.camio2, nou2) - self._calcular_km_viatge(action.camio2, viatge2))
+
+    def deltes_swapPeticions(self, veins_propers: int = None) -> Generator[Tuple[int, int, int, int, float], None, None]:
+        """
+        Genera la delta de cada operador swapPeticions entre peticions servides de camions diferents, sense crear
+        cap operador ni cap estat. Cada parella surt una sola vegada (camio1 < camio2).
+        :param veins_propers: si no és None, només les parelles plausibles: cada camió ha de ser un dels camions_desti
+            de la petició que rep, la mateixa definició de proper que fan servir els mourePeticio. El nombre de parelles
+            passa de quadràtic a O(peticions x veins_propers x 2 n_viatges).
+        Els operadors que passarien algun dels dos camions del límit de km no es generen.
+        :return: generador de tuples (id_peticio1, camio1, id_peticio2, camio2, delta de benefici)
+        """
+        index = self.index_veinatge()
+        limit = self.limit_km()
+        km = self._km_camions() if limit is not None else None
+        cost_km = self.params.cost_km
+        num_camions = len(self.camions)
+
+        if veins_propers is not None:
+            candidats = {id_peticio: set(self.camions_desti(id_peticio, index.camio[id_peticio], veins_propers))
+                         for id_peticio in index.peticions}
+
+        for id_camio1, viatges1 in enumerate(self.camions):
+            for viatge1 in viatges1:
+                for id_peticio1 in viatge1:
+                    if veins_propers is not None:
+                        camions2 = [c for c in self.camions_desti(id_peticio1, id_camio1, veins_propers) if c > id_camio1]
+                    else:
+                        camions2 = range(id_camio1 + 1, num_camions)
+                    km_sense1 = self._calcular_km_viatge(id_camio1, viatge1)
+                    for id_camio2 in camions2:
+                        for viatge2 in self.camions[id_camio2]:
+                            for id_peticio2 in viatge2:
+                                if veins_propers is not None and id_camio1 not in candidats[id_peticio2]:
+                                    continue
+                                nou1 = [id_peticio2 if p == id_peticio1 else p for p in viatge1]
+                                nou2 = [id_peticio1 if p == id_peticio2 else p for p in viatge2]
+                                delta1 = self._calcular_km_viatge(id_camio1, nou1) - km_sense1
+                                delta2 = self._calcular_km_viatge(id_camio2, nou2) - self._calcular_km_viatge(id_camio2, viatge2)
+                                if limit is not None and ((delta1 > 0 and km[id_camio1] + delta1 > limit) or
+                                                          (delta2 > 0 and km[id_camio2] + delta2 > limit)):
+                                    continue
+                                yield id_peticio1, id_camio1, id_peticio2, id_camio2, -(delta1 + delta2) * cost_km
+
+    def millors_swapPeticions(self, n: int = 1, veins_propers: int = None) -> List[Tuple[swapPeticions, float]]:
+        """
+        Els n millors operadors swapPeticions (veure deltes_swapPeticions), de més a menys delta, recorrent les
+        parelles una sola vegada amb un munt de mida n, sense crear els operadors que no hi entren.
+        :return: llista de parelles (operador, delta de benefici)
+        """
+        millors = heapq.nlargest(n, self.deltes_swapPeticions(veins_propers), key=lambda parella: parella[4])
+        return [(swapPeticions(*parella[:4]), parella[4]) for parella in millors]
+
+    def _delta_mourePeticio(self, action: mourePeticio) -> float:
+        """
+        Delta de mourePeticio. Només mira el viatge d'on surt la petició i l'últim viatge del camió destí,
+        seguint exactament les mateixes regles que apply_action.
+        """
+        deltes_km = self._km_mourePeticio(action)
+        if deltes_km is None:
+            return None
+        return self._delta_de_km(action, deltes_km)
+
+    def _delta_de_km(self, action: mourePeticio, deltes_km) -> float:
+        delta_origen, delta_desti, pendent = deltes_km
+        delta = -(delta_origen + delta_desti) * self.params.cost_km
+        return delta - self._valor_servir(action.id_peticio) if pendent else delta
+
+    def _km_mourePeticio(self, action: mourePeticio):
+        """
+        Canvi de km del camió origen (treure la petició) i del camió destí (afegir-la) de mourePeticio,
+        amb les mateixes regles que apply_action.
+        :return: (delta km origen, delta km destí, si la petició queda pendent perquè no hi cap),
+            o None si la petició no és al camió origen (apply_action la duplicaria)
+        """
+        id_peticio = action.id_peticio
+        camio_origen = action.camio_origen
+        camio_desti = action.camio_desti
+
+        viatges_origen = self.camions[camio_origen]
+        viatge_origen = None
+        for viatge in viatges_origen:
+            if id_peticio in viatge:
+                viatge_origen = viatge
+                break
+        if viatge_origen is None:
+            return None
+
+        # Treure la petició del viatge origen
+        viatge_reduit = viatge_origen.copy()
+        viatge_reduit.remove(id_peticio)
+        delta_origen = self._calcular_km_viatge(camio_origen, viatge_reduit) - self._calcular_km_viatge(camio_origen, viatge_origen)
+
+        # Viatges del camió destí tal com quedarien després d'eliminar la petició de l'origen
+        if camio_desti == camio_origen:
+            viatges_desti = [viatge_reduit if v is viatge_origen else v for v in viatges_origen]
+            viatges_desti = [v for v in viatges_desti if v]
+        else:
+            viatges_desti = self.camions[camio_desti]
+
+        delta_desti = self._km_afegir(id_peticio, camio_desti, viatges_desti)
+        if delta_desti is None:
+            return delta_origen, 0, True
+        return delta_origen, delta_desti, False
+
+    def _delta_treure(self, id_camio: int, viatge: List[int], viatge_reduit: List[int]) -> float:
+        """
+        Delta de benefici dels km estalviats en treure una petició d'un viatge (viatge_reduit és el viatge sense la petició).
+        No compta que la petició deixa de ser servida: qui la crida hi suma el cost d'afegir-la al camió destí
+        (els km de _km_afegir), o li resta el valor de servir-la si el destí no té lloc i queda pendent.
+        """
+        delta_km = self._calcular_km_viatge(id_camio, viatge_reduit) - self._calcular_km_viatge(id_camio, viatge)
+        return -delta_km * self.params.cost_km
+
+    def _km_afegir(self, id_peticio: int, id_camio: int, viatges: List[List[int]]):
+        """
+        Km que s'afegeixen al camió afegint la petició als seus viatges, amb les mateixes regles que apply_action
+        (a l'últim viatge si hi cap, o en un viatge nou si el camió en pot fer més), o None si el camió no té lloc
+        i la petició queda pendent.
+        """
+        if viatges and len(viatges[-1]) < 2:
+            ultim_viatge = viatges[-1]
+            return self._calcular_km_viatge(id_camio, ultim_viatge + [id_peticio]) - self._calcular_km_viatge(id_camio, ultim_viatge)
+        elif not viatges or len(viatges) < self.params.n_viatges:
+            return self._calcular_km_viatge(id_camio, [id_peticio])
+        return None
+
+    def camions_desti(self, id_peticio: int, id_camio_origen: int, veins_propers: int = None) -> List[int]:
+        """
+        Camions destí dels operadors mourePeticio d'una petició servida.
+        :param veins_propers: si no és None, només els veins_propers camions amb el centre més proper a la gasolinera
+            de la petició (llista de candidats), de més a menys proper; si és None, tots els camions menys l'origen
+        """
+        if veins_propers is None:
+            return [id_camio for id_camio in range(len(self.camions)) if id_camio != id_camio_origen]
+        propers = self.instancia.camions_propers(veins_propers)[self.gasolinera_per_peticio[id_peticio]].tolist()
+        return [id_camio for id_camio in propers if id_camio != id_camio_origen][:veins_propers]
+
+    def deltes_mourePeticio(self, veins_propers: int = None) -> Generator[Tuple[int, int, int, float], None, None]:
+        """
+        Genera la delta de cada operador mourePeticio, en el mateix ordre que generate_all_actions,
+        sense crear cap operador ni cap estat.
+        :param veins_propers: limita els camions destí als més propers (veure camions_desti)
+        :return: generador de tuples (id_peticio, camio_origen, camio_desti, delta de benefici)
+        Els operadors que passarien el camió destí del límit de km no es generen (veure es_factible).
+        """
+        index = self.index_veinatge()
+        limit = self.limit_km()
+        km = self._km_camions() if limit is not None else None
+
+        for id_peticio in index.peticions:
+            id_camio_origen = index.camio[id_peticio]
+            viatge = self.camions[id_camio_origen][index.viatge[id_peticio]]
+
+            # El cost de treure la petició és el mateix per tots els camions destí
+            viatge_reduit = viatge.copy()
+            viatge_reduit.remove(id_peticio)
+            delta_treure = self._delta_treure(id_camio_origen, viatge, viatge_reduit)
+
+            for id_camio_desti in self.camions_desti(id_peticio, id_camio_origen, veins_propers):
+                km_afegits = self._km_afegir(id_peticio, id_camio_desti, self.camions[id_camio_desti])
+                if km_afegits is None: # El camió destí no té lloc: la petició passa a estar pendent
+                    yield id_peticio, id_camio_origen, id_camio_desti, delta_treure - self._valor_servir(id_peticio)
+                elif limit is None or km_afegits <= 0 or km[id_camio_desti] + km_afegits <= limit:
+                    yield id_peticio, id_camio_origen, id_camio_desti, delta_treure - km_afegits * self.params.cost_km
+
+    def millor_accio(self, veins_propers: int = None):
+        """
+        Avalua tots els operadors mourePeticio de generate_all_actions amb deltes, sense crear cap estat ni operador
+        intermedi, i retorna el millor. Els empats es resolen a l'atzar, com fa argmax_random_tie d'aima.
+        :param veins_propers: limita els camions destí als més propers (veure camions_desti)
+        :return: parella (operador, delta de benefici), o (None, None) si no hi ha cap operador aplicable
+        """
+        millor_accio = None
+        millor_delta = None
+        empats = 0
+
+        for id_peticio, id_camio_origen, id_camio_desti, delta in self.deltes_mourePeticio(veins_propers):
+            if millor_delta is None or delta > millor_delta:
+                millor_delta = delta
+                millor_accio = (id_peticio, id_camio_origen, id_camio_desti)
+                empats = 1
+            elif delta == millor_delta:
+                empats += 1
+                if random.randrange(empats) == 0:
+                    millor_accio = (id_peticio, id_camio_origen, id_camio_desti)
+
+        if millor_accio is None:
+            return None, None
+        return mourePeticio(*millor_accio), millor_delta
+
+    def _delta_swapCentres(self, action: swapCentres) -> float:
+        """
+        Delta de swapCentres: els viatges canvien de centre, només varien els km dels dos camions.
+        """
+        c1 = action.centre1
+        c2 = action.centre2
+        km_abans = sum(self._calcular_km_viatge(c1, v) for v in self.camions[c1]) + sum(self._calcular_km_viatge(c2, v) for v in self.camions[c2])
+        km_despres = sum(self._km_swapCentres(action))
+        return -(km_despres - km_abans) * self.params.cost_km
+
+    def _km_swapCentres(self, action: swapCentres) -> Tuple[float, float]:
+        """
+        Km dels camions centre1 i centre2 després d'intercanviar-se els viatges.
+        """
+        c1 = action.centre1
+        c2 = action.centre2
+        return (sum(self._calcular_km_viatge(c1, v) for v in self.camions[c2]),
+                sum(self._calcular_km_viatge(c2, v) for v in self.camions[c1]))
+
+    def _valor_servir(self, i_peticio: int) -> float:
+        """
+        Diferència de benefici entre servir una petició i deixar-la pendent (sense comptar els km):
+        s'ingressa el seu preu i s'evita la seva penalització.
+        """
+        factor_preu = self._factor_de_preu(self.peticions_info[i_peticio])
+        return self.params.valor * factor_preu + self.params.valor * (self._factor_de_preu(0) - factor_preu)
     
     def calcular_ingressos_servits(self) -> float:
         ingressos = 0.0
-        for camio in self.camions:
+        cost_viatges = self.instancia.cost_viatges
+        for id_camio, camio in enumerate(self.camions):
             for viatge in camio:
-                for i_peticio in viatge:
-                    dies_pendents = self.peticions_info[i_peticio]
-                    factor_preu = self._factor_de_preu(dies_pendents)
-                    ingressos += self.params.valor * factor_preu
+                ingressos += cost_viatges.ingressos(id_camio, viatge)
         return ingressos
 
     def _get_peticions_servides(self) -> Set[int]:
         """Retorna el conjunt de peticions servides"""
-        servides = set()
-        for camio in self.camions:
-            for viatge in camio:
-                for i_peticio in viatge:
-                    servides.add(i_peticio)
-        return servides
+        servides = self._seguiment_servides()
+        return {i_peticio for i_peticio in range(len(servides)) if servides[i_peticio]}
 
 
     def calcular_cost_km(self) -> float:
@@ -87,40 +483,25 @@ class StateRepresentation(object):
         """
         Calcula els km totals d'un viatge d'un camió donat.
         Un viatge comença al centre de distribució del camió, visita les gasolineres de les peticions i torna al centre.
+        Els km de cada viatge es guarden a la memòria cau de la instància (CostViatges).
         """
-        coords_actuals = (self.params.centres.centres[id_camio].cx, self.params.centres.centres[id_camio].cy) # Les coordenades actuals del camió, comencem des del centre de distribució
-        km_totals = 0.0
-
-        for i_peticio in viatge:
-            id_gasolinera = self.gasolinera_per_peticio[i_peticio] # Tenim el índex de la petició, obtenim la gasolinera associada
-            gasolinera = self.params.gasolineres.gasolineres[id_gasolinera] # Obtenim l'objecte Gasolinera
-            coords_gasolinera = (gasolinera.cx, gasolinera.cy)  # Obtenim les coordenades de la gasolinera asociada a la petició
-            km_totals += self._manhattan(coords_actuals, coords_gasolinera) # Afegim als quilòmetres totals la distància que acabem de recórrer
-            coords_actuals = coords_gasolinera  # Actualitzem les coordenades actuals del camió
-
-        # Tornar al centre de distribució
-        coords_centre = (self.params.centres.centres[id_camio].cx, self.params.centres.centres[id_camio].cy) # Coordenades del centre de distribució
-        km_totals += self._manhattan(coords_actuals, coords_centre) # Afegim els quilòmetres per tornar al centre
-
-        return km_totals # Retornem els quilòmetres totals del viatge
+        return self.instancia.cost_viatges.cost(id_camio, viatge)[0]
     
     def calcular_penalitzacio_pendents(self) -> float:
         """
         Calcula la penalització per les peticions no servides avui.
         La penalització és la suma de les pèrdues de preu per cada petició no servida.
+        El total es manté amb el registre de peticions servides, i aplicar_in_situ l'actualitza en temps constant.
         """
+        self._seguiment_servides()
+        return self._penalitzacio
 
-        penalitzacio = 0.0
-        peticions_servides = self._get_peticions_servides()  # Calculem-ho aquí
-        peticions_totals = len(self.peticions_info)
-        
-        for i_peticio in range(peticions_totals):
-            if i_peticio not in peticions_servides:
-                dies_pendents = self.peticions_info[i_peticio]
-                factor_preu = self._factor_de_preu(dies_pendents)
-                penalitzacio += self.params.valor * (self._factor_de_preu(0) - factor_preu)
-        
-        return penalitzacio
+    def _penalitzacio_peticio(self, i_peticio: int) -> float:
+        """
+        Pèrdua de preu d'una petició si queda pendent.
+        """
+        factor_preu = self._factor_de_preu(self.peticions_info[i_peticio])
+        return self.params.valor * (self._factor_de_preu(0) - factor_preu)
 
     
     def _factor_de_preu(self, dies: int) -> float: #f(d) del meu escrit :)
@@ -128,10 +509,8 @@ class StateRepresentation(object):
         Factor de preu en funció dels dies que han passat per petició.
         Els dies són estrictament positius.
         """
-        if dies == 0:
-            return 1.02
-        else: return max(0, 1-0.02 * dies)
-        
+        return factor_de_preu(dies)
+
     
     def _manhattan(self, c1, c2):
         """
@@ -139,153 +518,214 @@ class StateRepresentation(object):
         """
         return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1])
     
-    def _copy(self) -> 'StateRepresentation':
+    def _copy(self, copia_index: bool = False) -> 'StateRepresentation':
         """
-        Crea una còpia profunda de l'estat actual.
+        Crea una còpia de l'estat actual.
+        Les dades de la instància es comparteixen per referència. Les llistes de viatges de cada camió també es
+        comparteixen entre les dues còpies fins que una d'elles modifica el camió amb aplicar_in_situ, que llavors
+        se'n fa una còpia pròpia (veure _camio_propi): copiar un estat només copia la llista de camions, i cada
+        estat només ocupa memòria pels camions que ha canviat. Per tant, els viatges d'un estat copiat no s'han de
+        modificar directament, només amb aplicar_in_situ.
+        Per defecte l'índex de veïnatge no es copia: la majoria de còpies són veïns que es descarten, i si cal es reconstrueix.
+        :param copia_index: si és cert i l'estat té l'índex de veïnatge construït, també se'n copia
         :return: nova instància de StateRepresentation amb les mateixes dades
         """
 
         new_state = StateRepresentation(self.params)
-        new_state.peticions_info = self.peticions_info.copy()
-        new_state.gasolinera_per_peticio = self.gasolinera_per_peticio.copy()
-        new_state.camions = [[viatge.copy() for viatge in camio] for camio in self.camions]  # Còpia profunda
+        new_state.peticions_info = self.peticions_info
+        new_state.gasolinera_per_peticio = self.gasolinera_per_peticio
+        new_state.camions = self.camions.copy()  # Els camions es comparteixen fins que se'n modifica un
+        new_state._propis = bytearray(len(self.camions))
+        self._propis = bytearray(len(self.camions)) # L'estat original tampoc pot modificar els camions compartits
+        new_state._benefici = self._benefici
+        if self._servides is not None:
+            new_state._servides = self._servides.copy()
+            new_state._penalitzacio = self._penalitzacio
+        if self._km is not None:
+            new_state._km = self._km.copy()
+        if copia_index and self._index is not None:
+            new_state._index = self._index.copy()
         return new_state
 
     
 
-    def apply_action(self, action: CamionsOperator) -> 'StateRepresentation':
+    def _camio_propi(self, id_camio: int) -> list:
+        """
+        Llista de viatges del camió, que l'estat pot modificar: si encara la comparteix amb una còpia, abans se'n fa
+        una de pròpia (com a molt n_viatges viatges).
+        """
+        if self._propis is not None and not self._propis[id_camio]:
+            self.camions[id_camio] = [viatge.copy() for viatge in self.camions[id_camio]]
+            self._propis[id_camio] = 1
+        return self.camions[id_camio]
+
+    def apply_action(self, action: CamionsOperator, hereta_index: bool = False) -> 'StateRepresentation':
         """
         Aplica un operador a l'estat actual i retorna el nou estat resultant.
+        El benefici del nou estat es calcula amb delta_benefici, sense recórrer totes les peticions.
         :param action: operador a aplicar
+        :param hereta_index: si és cert, el nou estat es queda l'índex de veïnatge d'aquest estat (sense copiar-lo)
+            la primera vegada que el necessita, en lloc de reconstruir-lo. Pensat per les cerques que creen molts
+            veïns i només n'expandeixen un: només aquell pren l'índex, i la resta no paguen res.
         :return: nou estat després d'aplicar l'operador
         """
         
+        self.heuristica() # Ens assegurem que el benefici de l'estat actual està calculat per poder-hi sumar la delta
         new_state = self._copy()
+        new_state.aplicar_in_situ(action)
+        if hereta_index and self._index is not None:
+            new_state._index_pare = (self, self._index, self._index.versio, action)
+        return new_state
+
+    def aplicar_in_situ(self, action: CamionsOperator):
+        """
+        Aplica un operador modificant l'estat actual, sense crear-ne cap de nou.
+        Si el benefici de l'estat ja estava calculat, s'actualitza amb delta_benefici.
+        :param action: operador a aplicar
+        """
+        delta = self._delta(action) if self._benefici is not None else None
 
         # Primer apliquem l'operador swapCentres, que intercanvia els centres de dos camions
         if isinstance(action, swapCentres):
             c1 = action.centre1
             c2 = action.centre2
-            new_state.camions[c1], new_state.camions[c2] = new_state.camions[c2], new_state.camions[c1]
+            if self._km is not None:
+                self._km[c1], self._km[c2] = self._km_swapCentres(action)
+            self.camions[c1], self.camions[c2] = self.camions[c2], self.camions[c1]
+            if self._propis is not None:
+                self._propis[c1], self._propis[c2] = self._propis[c2], self._propis[c1]
 
         elif isinstance(action, mourePeticio):
             id_peticio = action.id_peticio
             camio_origen = action.camio_origen
             camio_desti = action.camio_desti
+
+            if self._km is not None:
+                deltes_km = self._km_mourePeticio(action)
+                if deltes_km is None: # La petició no és al camió origen: es tornaran a calcular
+                    self._km = None
+                else:
+                    self._km[camio_origen] += deltes_km[0]
+                    self._km[camio_desti] += deltes_km[1]
             
             # Eliminar la petició del camió origen
-            for viatge in new_state.camions[camio_origen]:
+            treta = False
+            for viatge in self._camio_propi(camio_origen):
                 if id_peticio in viatge:
                     viatge.remove(id_peticio)
+                    treta = True
                     break
             
             # Eliminar viatges buits
-            new_state.camions[camio_origen] = [v for v in new_state.camions[camio_origen] if v]
+            self.camions[camio_origen] = [v for v in self.camions[camio_origen] if v]
             
             # Afegir al camió destí
-            if new_state.camions[camio_desti]:
-                if len(new_state.camions[camio_desti][-1]) < 2:
-                    new_state.camions[camio_desti][-1].append(id_peticio)
-                elif len(new_state.camions[camio_desti]) < self.params.n_viatges:
-                    new_state.camions[camio_desti].append([id_peticio])
+            afegida = True
+            self._camio_propi(camio_desti)
+            if self.camions[camio_desti]:
+                if len(self.camions[camio_desti][-1]) < 2:
+                    self.camions[camio_desti][-1].append(id_peticio)
+                elif len(self.camions[camio_desti]) < self.params.n_viatges:
+                    self.camions[camio_desti].append([id_peticio])
+                else:
+                    afegida = False
             else:
-                new_state.camions[camio_desti].append([id_peticio])
-        return new_state
+                self.camions[camio_desti].append([id_peticio])
+
+            if self._servides is not None:
+                servida = afegida or (self._servides[id_peticio] == 1 and not treta)
+                if servida != (self._servides[id_peticio] == 1):
+                    self._servides[id_peticio] = servida
+                    penalitzacio = self._penalitzacio_peticio(id_peticio)
+                    self._penalitzacio += -penalitzacio if servida else penalitzacio
+
+        elif isinstance(action, swapPeticions):
+            viatges = self._viatges_swapPeticions(action)
+            if viatges is not None:
+                self._camio_propi(action.camio1)
+                self._camio_propi(action.camio2)
+                viatges = self._viatges_swapPeticions(action) # Els viatges de les còpies pròpies
+                if self._km is not None:
+                    delta1, delta2 = self._km_swapPeticions(action)
+                    self._km[action.camio1] += delta1
+                    self._km[action.camio2] += delta2
+                viatge1, viatge2 = viatges
+                viatge1[viatge1.index(action.id_peticio1)] = action.id_peticio2
+                viatge2[viatge2.index(action.id_peticio2)] = action.id_peticio1
+
+        else: # Operador desconegut: el registre de servides i els km es tornaran a calcular si cal
+            self._servides = None
+            self._penalitzacio = None
+            self._km = None
+
+        self._benefici = self._benefici + delta if delta is not None else None
+        if self._index is not None:
+            self._index.actualitza(self, action)
+        else:
+            self._index_pare = None # L'índex del pare ja no es pot posar al dia amb un sol operador
 
     
-    def generate_all_actions(self) -> Generator[CamionsOperator, None, None]:
+    def generate_all_actions(self, veins_propers: int = None, swap_peticions: bool = False) -> Generator[CamionsOperator, None, None]:
         """
         Genera tots els possibles operadors aplicables a l'estat actual.
+        Les peticions servides es recorren amb l'índex de veïnatge, sense tornar a recórrer els viatges.
+        :param veins_propers: si no és None, cada petició només es mou als veins_propers camions amb el centre més proper
+            a la seva gasolinera, i el veïnatge creix linealment amb el nombre de peticions en lloc de peticions x camions
+        Els operadors mourePeticio que passarien el camió destí del límit de km no es generen (veure es_factible).
+        :param swap_peticions: si és cert, també es generen els operadors swapPeticions (amb veins_propers, només
+            les parelles plausibles; veure deltes_swapPeticions)
         :return: generador d'operadors
         """
         num_camions = len(self.camions)
+        limit = self.limit_km()
+        km = self._km_camions() if limit is not None else None
 
         # Generar operadors swapCentres per cada parella de centres
         #for i in range(num_camions):
             #for j in range(i + 1, num_camions):
                 #yield swapCentres(i, j)
 
-        # Generar operadors mourePeticio per cada petició i camions diferents
-        for id_camio_origen in range(num_camions):
-            for viatge in self.camions[id_camio_origen]:
-                for id_peticio in viatge:
-                    for id_camio_desti in range(num_camions):
-                        if id_camio_desti != id_camio_origen:
-                            yield mourePeticio(id_peticio, id_camio_origen, id_camio_desti)
+        # Generar operadors mourePeticio per cada petició servida i camions diferents
+        index = self.index_veinatge()
+        for id_peticio in index.peticions:
+            id_camio_origen = index.camio[id_peticio]
+            if veins_propers is not None:
+                camions_desti = self.camions_desti(id_peticio, id_camio_origen, veins_propers)
+            else:
+                camions_desti = (id_camio for id_camio in range(num_camions) if id_camio != id_camio_origen)
+            for id_camio_desti in camions_desti:
+                if limit is not None:
+                    km_afegits = self._km_afegir(id_peticio, id_camio_desti, self.camions[id_camio_desti])
+                    if km_afegits is not None and km_afegits > 0 and km[id_camio_desti] + km_afegits > limit:
+                        continue
+                yield mourePeticio(id_peticio, id_camio_origen, id_camio_desti)
 
         # Generar operadors swapPeticions per cada parella de peticions en camions diferents
-        # for id_camio1 in range(num_camions):
-        #     for viatge1 in self.camions[id_camio1]:
-        #         for id_peticio1 in viatge1:
-        #             for id_camio2 in range(id_camio1 + 1, num_camions):
-        #                 for viatge2 in self.camions[id_camio2]:
-        #                     for id_peticio2 in viatge2:
-        #                         yield swapPeticions(id_peticio1, id_camio1, id_peticio2, id_camio2)
+        if swap_peticions:
+            for id_peticio1, id_camio1, id_peticio2, id_camio2, _ in self.deltes_swapPeticions(veins_propers):
+                yield swapPeticions(id_peticio1, id_camio1, id_peticio2, id_camio2)
 
-        return self.generate_all_actions()
-
-    def generate_actions_lazy(self) -> Generator['CamionsOperator', None, None]:
+    def generate_actions_lazy(self, aleatori=None, max_accions: int = 50,
+                              p_swap_centres: float = 0.3) -> Generator['CamionsOperator', None, None]:
         """
         Genera un conjunt petit d'accions aleatòries (lazy) per a Simulated Annealing.
-        Combina accions de tipus swapCentres i mourePeticio de manera equilibrada.
+        Combina accions de tipus swapCentres i mourePeticio de manera equilibrada. Les accions s'escullen amb l'índex
+        de veïnatge, que manté quins camions tenen viatges i quins poden rebre peticions, de manera que cada mostra
+        és un operador aplicable que respecta el límit de km. Escollir-lo no recorre ni crea cap llista, però cada mostra
+        crea el seu operador i la comprovació del límit (es_factible) costeja els viatges que canvien.
+        Com que són mostres independents, hi pot haver repeticions.
+        :param aleatori: random.Random, np.random.Generator, funció que retorna uniformes de [0, 1)
+            (veure camions_index.font_uniforme), o None pel generador global del mòdul random
+        :param max_accions: nombre d'accions a generar (amb Simulated Annealing de aima n'hi ha prou amb 1)
+        :param p_swap_centres: proporció d'accions swapCentres
         """
-        actions_generades = set()   # Accions ja generades per evitar duplicats
-        num_camions = len(self.camions)
-        max_accions = 50
-
+        uniforme = aleatori if callable(aleatori) else font_uniforme(aleatori)
+        index = self.index_veinatge()
         for _ in range(max_accions):
-
-            tipus = random.choices(
-                ['swapCentres', 'mourePeticio'],
-                weights=[0.3, 0.7]
-            )[0]
-
-            # === Intercanviar centres ===
-            if tipus == 'swapCentres':
-                c1, c2 = random.sample(range(num_camions), 2)
-
-                if self.camions[c1] and self.camions[c2]:
-                    accio = ('swapCentres', c1, c2)
-                    if accio not in actions_generades:
-                        actions_generades.add(accio)
-                        yield swapCentres(c1, c2)
-
-            # === Moure una petició ===
-            else:
-                id_camio_origen = random.randint(0, num_camions - 1)
-                if not self.camions[id_camio_origen]:
-                    continue
-
-                viatge_origen = random.choice(self.camions[id_camio_origen])
-                if not viatge_origen:
-                    continue
-
-                id_peticio = random.choice(viatge_origen)
-                id_camio_desti = random.choice(
-                    [i for i in range(num_camions) if i != id_camio_origen]
-                )
-
-                camio_desti = self.camions[id_camio_desti]
-                pot_afegir = False
-
-                # Condicions per afegir petició al destí
-                if not camio_desti:
-                    pot_afegir = True
-                else:
-                    ultim_viatge = camio_desti[-1]
-                    if len(ultim_viatge) < 2:
-                        pot_afegir = True
-                    elif len(camio_desti) < self.params.n_viatges:
-                        pot_afegir = True
-
-                if pot_afegir:
-                    accio = ('mourePeticio', id_peticio, id_camio_origen, id_camio_desti)
-                    if accio not in actions_generades:
-                        actions_generades.add(accio)
-                        yield mourePeticio(id_peticio, id_camio_origen, id_camio_desti)
-
-        # Final del generador (sense recursió infinita)
-        return
+            accio = index.accio_aleatoria(self, uniforme, p_swap_centres)
+            if accio is None:
+                return
+            yield accio
 
 
     def __eq__(self, other):
@@ -338,18 +778,11 @@ class StateRepresentation(object):
             ingressos_camio = 0.0
             
             for id_viatge, viatge in enumerate(camio):
-                km_viatge = self._calcular_km_viatge(id_camio, viatge)
+                km_viatge, ingressos_viatge = self.instancia.cost_viatges.cost(id_camio, viatge)
                 cost_viatge = km_viatge * self.params.cost_km
                 km_camio += km_viatge
                 cost_camio += cost_viatge
                 
-                # Calcular ingressos del viatge
-                ingressos_viatge = 0.0
-                for id_peticio in viatge:
-                    dies = self.peticions_info[id_peticio]
-                    factor = self._factor_de_preu(dies)
-                    ingressos_viatge += self.params.valor * factor
-                
                 ingressos_camio += ingressos_viatge
                 benefici_viatge = ingressos_viatge - cost_viatge
                 
@@ -359,32 +792,40 @@ class StateRepresentation(object):
                 output.append(f"      ├─ Ingressos viatge: {ingressos_viatge:.2f}€")
                 output.append(f"      └─ Benefici viatge: {benefici_viatge:.2f}€")
                 
-                # Desplaçaments detallats
+                # Desplaçaments detallats, en l'ordre de la ruta amb què es costeja el viatge
                 output.append(f"\n      🗺️  RUTA DEL VIATGE:")
                 coords_actuals = (centre.cx, centre.cy)
                 tram_num = 0
                 
-                for idx, id_peticio in enumerate(viatge):
-                    id_gas = self.gasolinera_per_peticio[id_peticio]
+                for id_gas in self.instancia.cost_viatges.ruta(id_camio, viatge):
                     gas = self.params.gasolineres.gasolineres[id_gas]
                     coords_gas = (gas.cx, gas.cy)
-                    distancia_tram = self._manhattan(coords_actuals, coords_gas)
-                    dies = self.peticions_info[id_peticio]
-                    factor = self._factor_de_preu(dies)
-                    preu = self.params.valor * factor
+                    if tram_num == 0:
+                        distancia_tram = self.instancia.distancies.centre_a_gasolinera(id_camio, id_gas)
+                    else:
+                        distancia_tram = self.instancia.distancies.entre_gasolineres(id_gas_anterior, id_gas)
+                    id_gas_anterior = id_gas
                     
-                    output.append(f"         {tram_num}. Centre ({coords_actuals[0]}, {coords_actuals[1]}) "
+                    output.append(f"         {tram_num}. {'Centre' if tram_num == 0 else 'Gasolinera'} "
+                                f"({coords_actuals[0]}, {coords_actuals[1]}) "
                                 f"→ Gasolinera {id_gas} ({coords_gas[0]}, {coords_gas[1]})")
                     output.append(f"            📏 Distància: {distancia_tram:.2f} km | "
                                 f"💵 Cost: {distancia_tram * self.params.cost_km:.2f}€")
-                    output.append(f"            📦 Petició {id_peticio}: {dies} dies pendents | "
-                                f"Factor preu: {factor:.2f} | Ingressos: {preu:.2f}€")
+                    # Una gasolinera amb dues peticions del viatge es visita una sola vegada
+                    for id_peticio in viatge:
+                        if self.gasolinera_per_peticio[id_peticio] != id_gas:
+                            continue
+                        dies = self.peticions_info[id_peticio]
+                        factor = self._factor_de_preu(dies)
+                        preu = self.params.valor * factor
+                        output.append(f"            📦 Petició {id_peticio}: {dies} dies pendents | "
+                                    f"Factor preu: {factor:.2f} | Ingressos: {preu:.2f}€")
                     
                     coords_actuals = coords_gas
                     tram_num += 1
                 
                 # Retorn al centre
-                distancia_retorn = self._manhattan(coords_actuals, (centre.cx, centre.cy))
+                distancia_retorn = self.instancia.distancies.centre_a_gasolinera(id_camio, id_gas_anterior)
                 output.append(f"         {tram_num}. Gasolinera ({coords_actuals[0]}, {coords_actuals[1]}) "
                             f"→ Centre ({centre.cx}, {centre.cy})")
                 output.append(f"            📏 Distància: {distancia_retorn:.2f} km | "
@@ -401,54 +842,47 @@ class StateRepresentation(object):
         output.append("\n" + "=" * 70)
         return "\n".join(output)
 
-    def _get_peticions_servides(self) -> Set[int]:
-        """Retorna el conjunt de peticions servides"""
-        servides = set()
-        for camio in self.camions:
-            for viatge in camio:
-                for i_peticio in viatge:
-                    servides.add(i_peticio)
-        return servides
+
+def _camio_mes_proper(estat: StateRepresentation) -> np.ndarray:
+    """
+    Camió amb el centre més proper a la gasolinera de cada petició, calculat de cop sobre la matriu
+    de distàncies camió x petició. En cas d'empat, el camió de menys id (np.argmin es queda amb el primer mínim).
+    :return: array amb el camió escollit per cada petició
+    """
+    distancies = estat.instancia.distancies.centre_gasolinera[:, list(estat.gasolinera_per_peticio)]
+    return np.argmin(distancies, axis=0)
+
+
+def _omple_viatges(estat: StateRepresentation, peticions, camio_per_peticio: np.ndarray):
+    """
+    Assigna les peticions, en l'ordre donat, al camió escollit per cadascuna: a l'últim viatge si hi cap,
+    en un viatge nou si el camió en pot fer més, i si no la petició queda pendent.
+    """
+    n_viatges = estat.params.n_viatges
+    camio_per_peticio = camio_per_peticio.tolist()
+    for i_peticio in peticions:
+        camio_viatges = estat.camions[camio_per_peticio[i_peticio]]
+        if not camio_viatges or len(camio_viatges[-1]) >= 2: # Si el camió no té viatges o l'últim viatge està ple
+            if len(camio_viatges) < n_viatges: # Si el camió pot afegir un nou viatge
+                camio_viatges.append([i_peticio]) # Creem un nou viatge amb la petició
+            # Si no, no es pot assignar aquesta petició
+        else:
+            camio_viatges[-1].append(i_peticio) # Afegim la petició a l'últim viatge existent
 
 
-    
 def generate_greedy_initial_state(params: ProblemParameters) -> StateRepresentation:
     """
     Assignar a cada camió les peticions més properes (de distància) fins a omplir la seva capacitat, 
     sense tenir en compte la penalització per peticions pendents.
+    El camió més proper de totes les peticions es calcula de cop amb numpy (veure _camio_mes_proper).
     :param params: paràmetres del problema
     :return: estat inicial generat
     """
     estat = StateRepresentation(params)
+    if not estat.camions:
+        return estat
 
-    num_camions = len(params.centres.centres)
-    num_peticions = len(estat.peticions_info)
-
-    for i_peticio in range(num_peticions): # Recorrem totes les peticions pel seu índex
-        id_gasolinera = estat.gasolinera_per_peticio[i_peticio] # Obtenim la gasolinera associada a la petició
-        gasolinera = params.gasolineres.gasolineres[id_gasolinera] # Obtenim l'objecte Gasolinera
-        coords_peticio = (gasolinera.cx, gasolinera.cy)
-
-        min_distancia = float('inf')
-        millor_camio = None
-
-        for id_camio in range(num_camions): # Recorrem cada camió pel seu índex
-            centre = params.centres.centres[id_camio] # Obtenim l'objecte Centre de distribució
-            coords_centre = (centre.cx, centre.cy)
-            distancia = estat._manhattan(coords_peticio, coords_centre) # calculem la distància entre la petició i el centre 
-            if distancia < min_distancia : # Si la distància és menor que la mínima trobada fins ara
-                min_distancia = distancia
-                millor_camio = id_camio
-
-        if millor_camio is not None: # si ja tenim un camió assignat
-            camio_viatges = estat.camions[millor_camio]
-            if not camio_viatges or len(camio_viatges[-1]) >= 2: # Si el camió no té viatges o l'últim viatge està ple
-                if len(camio_viatges) < params.n_viatges: # Si el camió pot afegir un nou viatge
-                    camio_viatges.append([i_peticio]) # Creem un nou viatge amb la petició
-                else:
-                    continue  # No es pot assignar aquesta petició
-            else:
-                camio_viatges[-1].append(i_peticio) # Afegim la petició a l'últim viatge existent
+    _omple_viatges(estat, range(len(estat.peticions_info)), _camio_mes_proper(estat))
     return estat
 
 def generate_empty_initial_state(params: ProblemParameters) -> StateRepresentation:
@@ -467,56 +901,189 @@ def generate_initial_state(parametres: ProblemParameters) -> StateRepresentation
     la seva capacitat i distància. Després, si és compatible per distància i capacitat, 
     s'assigna la petició més propera geogràficament, i en cas d'empat, la que tingui més dies pendents, 
     i en cas d'empat, la que impliqui menys distància de retorn al centre assignat al camió. 
+    Els dies pendents són els mateixos per tots els camions i la distància de retorn és la mateixa que la d'anada,
+    de manera que el camió escollit és el primer de distància mínima, i es calcula de cop amb numpy.
     :param parametres: paràmetres del problema
     :return: estat inicial generat
     """
     estat = StateRepresentation(parametres)
+    if not estat.camions:
+        return estat
 
-    nombre_camions = len(parametres.centres.centres)
-    nombre_peticions = len(estat.peticions_info)
-
-    peticions_ordenades = sorted( # ordenem les peticions segons el seu factor de preu, de més alt a més baix
-        range(nombre_peticions),
-        key=lambda i: (-estat._factor_de_preu(estat.peticions_info[i]), i)
-    )
-
-    for id_peticio in peticions_ordenades: #recorrem les peticions ordenades segons la seva prioritat
-        id_gasolinera = estat.gasolinera_per_peticio[id_peticio]
-        gasolinera = parametres.gasolineres.gasolineres[id_gasolinera]
-        coordenades_peticio = (gasolinera.cx, gasolinera.cy)
-
-        millor_camio = None
-        millor_distancia = float('inf')
-        millors_dies_pendents = -1
-        millor_distancia_retor = float('inf')
-
-        for id_camio in range(nombre_camions): # Recorrem cada camió pel seu índex
-            centre = parametres.centres.centres[id_camio]
-            coordenades_centre = (centre.cx, centre.cy)
-            distancia = estat._manhattan(coordenades_peticio, coordenades_centre)
-            dies_pendents = estat.peticions_info[id_peticio]
-            distancia_retor = estat._manhattan(coordenades_peticio, coordenades_centre)
-
-            # Prioritzem segons la distància, dies pendents i distància de retorn
-
-            if (distancia < millor_distancia or
-                (distancia == millor_distancia and dies_pendents > millors_dies_pendents) or
-                (distancia == millor_distancia and dies_pendents == millors_dies_pendents and distancia_retor < millor_distancia_retor)):
-                millor_distancia = distancia
-                millors_dies_pendents = dies_pendents
-                millor_distancia_retor = distancia_retor
-                millor_camio = id_camio
-
-        if millor_camio is not None:
-            camio_viatges = estat.camions[millor_camio]
-
-            if not camio_viatges or len(camio_viatges[-1]) >= 2:
-                if len(camio_viatges) < parametres.n_viatges:
-                    camio_viatges.append([id_peticio])
-                else:
-                    continue  # No es pot assignar aquesta petició
-            else:
-                camio_viatges[-1].append(id_peticio)
+    factors = np.array([estat._factor_de_preu(dies) for dies in estat.peticions_info])
+    peticions_ordenades = np.argsort(-factors, kind='stable').tolist() # de factor de preu més alt a més baix, els empats per id
+
+    _omple_viatges(estat, peticions_ordenades, _camio_mes_proper(estat))
+    return estat
+
+def generate_regret_initial_state(params: ProblemParameters, k: int = 2,
+                                  veins_propers: int = VEINS_PROPERS_REGRET) -> StateRepresentation:
+    """
+    Inserció per regret-k: a cada pas s'insereix la petició que més es perdria si no s'assignés ara al seu
+    millor camió, és a dir la de més regret, la suma de la diferència de benefici entre la millor inserció
+    i les k - 1 següents (les insercions que no hi caben o no són rendibles compten com deixar-la pendent, benefici 0).
+    El benefici d'una inserció és el que s'obté servint la petició menys el cost dels km afegits, amb les
+    mateixes regles d'inserció que apply_action (a l'últim viatge si hi cap, o en un viatge nou si el camió en pot fer més).
+    Cada petició només es pot inserir als seus camions candidats, els veins_propers camions amb el centre més proper
+    a la seva gasolinera (InstanciaProblema.camions_propers), i el regret es calcula entre aquests.
+    Les peticions que no són rendibles a cap candidat, o que no hi caben sense passar del límit de km, queden pendents.
+    El regret d'una petició pot pujar o baixar quan un camió rep una inserció (per exemple, puja si s'omple el
+    segon millor camió), de manera que després de cada inserció es torna a calcular la clau de les peticions
+    pendents afectades: les que tenen el camió modificat entre els seus candidats i el tenien entre els seus k millors
+    o ara hi entraria. Així la cua sempre té les claus exactes i l'ordre d'inserció és el mateix que si es recalculés
+    tot a cada pas, i el cost de cada pas depèn de les peticions a prop del camió, no del nombre de camions.
+    :param params: paràmetres del problema
+    :param k: nombre d'insercions que es comparen per calcular el regret (k = 1 és una inserció golafre pel benefici)
+    :param veins_propers: camions candidats de cada petició (None per tenir-los tots en compte)
+    :return: estat inicial generat
+    """
+    if k < 1:
+        raise ValueError(f"El regret-k necessita k >= 1, s'ha donat k = {k}")
+    estat = StateRepresentation(params)
+    num_camions = len(estat.camions)
+    num_peticions = len(estat.peticions_info)
+    if not num_camions:
+        return estat
+
+    distancies = estat.instancia.distancies
+    cg = distancies.centre_gasolinera
+    gasolineres = np.asarray(estat.gasolinera_per_peticio, dtype=np.intp)
+    if veins_propers is None or veins_propers >= num_camions:
+        candidats = np.broadcast_to(np.arange(num_camions), (num_peticions, num_camions))
+    else:
+        # Ordenats per id perquè, com amb tots els camions, els empats es resolguin pel camió de menys id
+        candidats = np.sort(estat.instancia.camions_propers(veins_propers)[gasolineres, :veins_propers], axis=1)
+    num_candidats = candidats.shape[1]
+    # Peticions que tenen cada camió entre els seus candidats: peticions_candidat[inici[c]:inici[c + 1]] pel camió c
+    ordre_candidats = np.argsort(candidats.ravel(), kind='stable')
+    peticions_candidat = ordre_candidats // num_candidats
+    inici = np.searchsorted(candidats.ravel()[ordre_candidats], np.arange(num_camions + 1))
+
+    valors = np.array([estat._valor_servir(i_peticio) for i_peticio in range(num_peticions)])
+    ultima_gasolinera = np.full(num_camions, -1, dtype=np.intp) # gasolinera de l'últim viatge si hi cap una petició més
+    viatges_fets = np.zeros(num_camions, dtype=np.intp)
+    km_camions = np.zeros(num_camions, dtype=np.int64)
+    limit = estat.limit_km()
+
+    def beneficis_insercio(peticions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Benefici d'inserir cada petició a cada candidat (-inf si no hi cap) i km que s'hi afegeixen (peticions x candidats)
+        camions = candidats[peticions]
+        g = gasolineres[peticions][:, None]
+        cg_g = cg[camions, g].astype(np.int64)
+        g_ultim = ultima_gasolinera[camions]
+        te_ultim = g_ultim >= 0
+        g_ultim = np.where(te_ultim, g_ultim, 0)
+        km_ultim = distancies.entre_gasolineres_array(g_ultim, g) + cg_g - cg[camions, g_ultim].astype(np.int64)
+        km = np.where(te_ultim, km_ultim, np.where(viatges_fets[camions] < params.n_viatges, 2 * cg_g, np.inf))
+        if limit is not None:
+            km = np.where(km_camions[camions] + km > limit, np.inf, km)
+        return valors[peticions][:, None] - km * params.cost_km, km
+
+    def beneficis_camio(camio: int, peticions: np.ndarray) -> np.ndarray:
+        # El mateix que beneficis_insercio però per un sol camió
+        g = gasolineres[peticions]
+        cg_g = cg[camio, g].astype(np.int64)
+        if ultima_gasolinera[camio] >= 0:
+            g_ultim = ultima_gasolinera[camio]
+            km = distancies.entre_gasolineres_array(g_ultim, g) + cg_g - int(cg[camio, g_ultim])
+        elif viatges_fets[camio] < params.n_viatges:
+            km = 2 * cg_g
+        else:
+            return np.full(len(peticions), -np.inf)
+        if limit is not None:
+            km = np.where(km_camions[camio] + km > limit, np.inf, km)
+        return valors[peticions] - km * params.cost_km
+
+    kk = min(k, num_candidats)
+    millors_camions = np.full((num_peticions, kk), -1, dtype=np.intp) # els k millors camions de cada petició
+    llindar = np.zeros(num_peticions) # benefici (mínim 0) del k-èsim millor camió: per sota no canvia el regret
+    vigent = [None] * num_peticions # clau actual de cada petició a la cua (None si no hi és)
+    insercio = [None] * num_peticions # (camió, km afegits) de la millor inserció de cada petició
+    camio_insercio = np.full(num_peticions, -1, dtype=np.intp)
+
+    def actualitza(peticions: np.ndarray):
+        # Torna a calcular la clau de les peticions i afegeix a la cua les rendibles (les entrades antigues queden obsoletes)
+        beneficis, km = beneficis_insercio(peticions)
+        files = np.arange(len(peticions))[:, None]
+        if kk < num_candidats:
+            ordre = np.argpartition(-beneficis, kk - 1, axis=1)[:, :kk]
+        else:
+            ordre = np.broadcast_to(np.arange(num_candidats), beneficis.shape)
+        millors = -np.sort(-np.maximum(beneficis[files, ordre], 0), axis=1)
+        millors_camions[peticions] = candidats[peticions[:, None], ordre]
+        llindar[peticions] = millors[:, -1] if kk == k else 0.0
+        columna = np.argmax(beneficis, axis=1) # en cas d'empat, el candidat de menys id
+        millor = beneficis[files[:, 0], columna]
+        camio = candidats[peticions, columna]
+        regret = (millor[:, None] - millors[:, 1:]).sum(axis=1)
+        if kk < k: # Amb menys de k candidats, els que falten compten com deixar-la pendent
+            regret += (k - kk) * np.maximum(millor, 0)
+        km_camio = km[files[:, 0], columna]
+        camio_insercio[peticions] = camio
+        for clau_regret, clau_millor, i_peticio, id_camio, km_afegits in zip((-regret).tolist(), (-millor).tolist(),
+                                                                           peticions.tolist(), camio.tolist(), km_camio.tolist()):
+            if clau_millor >= 0: # No és rendible a cap candidat
+                vigent[i_peticio] = None
+                continue
+            entrada = (clau_regret, clau_millor, i_peticio)
+            insercio[i_peticio] = (id_camio, int(km_afegits))
+            if entrada != vigent[i_peticio]: # Si la clau no canvia, l'entrada que ja hi ha a la cua continua valent
+                vigent[i_peticio] = entrada
+                heapq.heappush(cua, entrada)
+
+    cua = []
+    actualitza(np.arange(num_peticions))
+    pendents = np.ones(num_peticions, dtype=bool)
+
+    while cua:
+        entrada = heapq.heappop(cua)
+        i_peticio = entrada[2]
+        if vigent[i_peticio] != entrada: # Entrada obsoleta: la petició ja té una clau més nova a la cua
+            continue
+        vigent[i_peticio] = None
+        pendents[i_peticio] = False
+        camio, km_afegits = insercio[i_peticio]
+
+        km_camions[camio] += km_afegits
+        if ultima_gasolinera[camio] >= 0:
+            estat.camions[camio][-1].append(i_peticio)
+            ultima_gasolinera[camio] = -1
+        else:
+            estat.camions[camio].append([i_peticio])
+            viatges_fets[camio] += 1
+            ultima_gasolinera[camio] = gasolineres[i_peticio]
+
+        # Només ha canviat el benefici d'inserir al camió modificat, i només per les peticions que el tenen de candidat
+        peticions = peticions_candidat[inici[camio]:inici[camio + 1]]
+        peticions = peticions[pendents[peticions]]
+        nous = beneficis_camio(camio, peticions)
+        # El >= detecta els empats amb un camió de menys id, que passaria a ser el de la millor inserció
+        afectades = ((millors_camions[peticions] == camio).any(axis=1) | (camio_insercio[peticions] == camio)
+                     | (nous >= llindar[peticions]))
+        if afectades.any():
+            actualitza(peticions[afectades])
     return estat
 
+def generate_random_initial_state(params: ProblemParameters, seed: int = None) -> StateRepresentation:
+    """
+    Assigna cada petició, en ordre aleatori, a un camió aleatori. Si el camió ja té tots els viatges plens,
+    la petició queda pendent. Serveix per reiniciar la cerca des de punts diferents de l'espai d'estats.
+    :param params: paràmetres del problema
+    :param seed: llavor del generador aleatori (None per no fixar-la)
+    :return: estat inicial generat
+    """
+    estat = StateRepresentation(params)
+    aleatori = random.Random(seed)
 
+    num_camions = len(estat.camions)
+    peticions = list(range(len(estat.peticions_info)))
+    aleatori.shuffle(peticions)
+
+    for i_peticio in peticions:
+        camio_viatges = estat.camions[aleatori.randrange(num_camions)]
+        if not camio_viatges or len(camio_viatges[-1]) >= 2:
+            if len(camio_viatges) < params.n_viatges:
+                camio_viatges.append([i_peticio])
+        else:
+            camio_viatges[-1].append(i_peticio)
+    return estat
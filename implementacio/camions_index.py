@@ -0,0 +1,277 @@
+import random
+from typing import Callable, Optional
+
+import numpy as np
+
+from .camions_operadors import CamionsOperator, mourePeticio, swapCentres, swapPeticions
+
+
+INTENTS_ACCIO_FACTIBLE = 32 # Operadors aleatoris que es proven per trobar-ne un que respecti el límit de km
+
+
+class ConjuntIndexat(object):
+    '''
+    Conjunt d'enters entre 0 i n-1 que permet afegir, treure i escollir un element a l'atzar en temps constant,
+    sense crear llistes ni conjunts: una llista dels elements i la posició de cada element a la llista.
+    '''
+
+    def __init__(self, n: int):
+        self.elements = []
+        self.posicio = [-1] * n # Posició de cada element a self.elements (-1 si no hi és)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __contains__(self, element: int):
+        return self.posicio[element] >= 0
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __repr__(self):
+        return f"ConjuntIndexat({sorted(self.elements)})"
+
+    def posa(self, element: int, present: bool):
+        '''
+        Afegeix o treu l'element segons present.
+        '''
+        if present and self.posicio[element] < 0:
+            self.posicio[element] = len(self.elements)
+            self.elements.append(element)
+        elif not present and self.posicio[element] >= 0:
+            # Posem l'últim element al lloc del que traiem per no haver de desplaçar la llista
+            posicio = self.posicio[element]
+            ultim = self.elements.pop()
+            if ultim != element:
+                self.elements[posicio] = ultim
+                self.posicio[ultim] = posicio
+            self.posicio[element] = -1
+
+    def escull(self, u: float) -> int:
+        '''
+        Element a l'atzar a partir d'un uniforme u de [0, 1). El conjunt no pot ser buit.
+        '''
+        return self.elements[int(u * len(self.elements))]
+
+    def escull_excepte(self, u: float, exclos: int) -> Optional[int]:
+        '''
+        Element a l'atzar diferent d'exclos a partir d'un uniforme u de [0, 1), o None si no n'hi ha cap.
+        '''
+        n = len(self.elements)
+        if self.posicio[exclos] < 0:
+            return self.elements[int(u * n)] if n else None
+        if n < 2:
+            return None
+        # Escollim entre les n-1 primeres posicions; si surt l'exclòs, el substitueix l'últim element
+        element = self.elements[int(u * (n - 1))]
+        return self.elements[n - 1] if element == exclos else element
+
+    def copy(self) -> 'ConjuntIndexat':
+        nou = ConjuntIndexat.__new__(ConjuntIndexat)
+        nou.elements = self.elements.copy()
+        nou.posicio = self.posicio.copy()
+        return nou
+
+
+class UniformesNumpy(object):
+    '''
+    Font d'uniformes de [0, 1) a partir d'un np.random.Generator. Els nombres es generen per blocs,
+    de manera que cada mostra és una lectura d'una llista i no una crida a numpy.
+    '''
+
+    def __init__(self, generador: np.random.Generator, mida_bloc: int = 4096):
+        self.generador = generador
+        self.mida_bloc = mida_bloc
+        self._bloc = []
+        self._posicio = 0
+
+    def __repr__(self):
+        return f"UniformesNumpy(generador={self.generador}, mida_bloc={self.mida_bloc})"
+
+    def random(self) -> float:
+        if self._posicio == len(self._bloc):
+            self._bloc = self.generador.random(self.mida_bloc).tolist()
+            self._posicio = 0
+        u = self._bloc[self._posicio]
+        self._posicio += 1
+        return u
+
+
+def font_uniforme(aleatori=None) -> Callable[[], float]:
+    '''
+    Funció sense arguments que retorna uniformes de [0, 1).
+    :param aleatori: random.Random, np.random.Generator (embolcallat amb UniformesNumpy), qualsevol objecte amb
+        un mètode random(), o None pel generador global del mòdul random
+    '''
+    if aleatori is None:
+        return random.random
+    if isinstance(aleatori, np.random.Generator):
+        return UniformesNumpy(aleatori).random
+    return aleatori.random
+
+
+class IndexVeinatge(object):
+    '''
+    Índex de les posicions de les peticions servides d'un estat: per cada petició, el camió i el viatge
+    (posició dins de la llista de viatges del camió) que la serveixen. Permet enumerar el veïnatge
+    mourePeticio i escollir-ne un operador a l'atzar sense recórrer les llistes niades de camions.
+    També guarda quins camions tenen algun viatge, quins poden rebre una petició més (tenen lloc en l'últim viatge
+    o poden fer-ne un de nou, i no han arribat al límit de km) i quins són plens, per mostrejar operadors directament.
+    L'estat el manté actualitzat cada vegada que s'aplica un operador amb aplicar_in_situ.
+    '''
+
+    def __init__(self, estat):
+        self.peticions = ConjuntIndexat(len(estat.peticions_info)) # Peticions servides, en qualsevol ordre
+        self.camio = [-1] * len(estat.peticions_info)        # Camió que serveix cada petició (-1 si no és servida)
+        self.viatge = [-1] * len(estat.peticions_info)       # Viatge del camió que serveix cada petició (-1 si no és servida)
+        self.ocupats = ConjuntIndexat(len(estat.camions))    # Camions amb algun viatge
+        self.amb_lloc = ConjuntIndexat(len(estat.camions))   # Camions que poden rebre una petició més
+        self.plens = ConjuntIndexat(len(estat.camions))      # Camions sense lloc per cap petició més
+        self.versio = 0                                      # Actualitzacions fetes (veure StateRepresentation.index_veinatge)
+        for id_camio in range(len(estat.camions)):
+            self._reindexa_camio(estat, id_camio)
+
+    def __len__(self):
+        return len(self.peticions)
+
+    def copy(self) -> 'IndexVeinatge':
+        '''
+        Còpia de l'índex, per a un estat copiat que encara té els mateixos viatges.
+        '''
+        nou = IndexVeinatge.__new__(IndexVeinatge)
+        nou.peticions = self.peticions.copy()
+        nou.camio = self.camio.copy()
+        nou.viatge = self.viatge.copy()
+        nou.ocupats = self.ocupats.copy()
+        nou.amb_lloc = self.amb_lloc.copy()
+        nou.plens = self.plens.copy()
+        nou.versio = 0
+        return nou
+
+    def _treu(self, id_peticio: int):
+        self.peticions.posa(id_peticio, False)
+        self.camio[id_peticio] = -1
+        self.viatge[id_peticio] = -1
+
+    def _reindexa_camio(self, estat, id_camio: int):
+        '''
+        Torna a indexar les peticions d'un camió (com a molt 2 * n_viatges).
+        '''
+        camio = estat.camions[id_camio]
+        for id_viatge, viatge in enumerate(camio):
+            for id_peticio in viatge:
+                self.peticions.posa(id_peticio, True)
+                self.camio[id_peticio] = id_camio
+                self.viatge[id_peticio] = id_viatge
+
+        # El mateix criteri que aplicar_in_situ per afegir una petició al camió destí sense perdre-la
+        ple = bool(camio) and len(camio[-1]) == 2 and len(camio) >= estat.params.n_viatges
+        limit = estat.limit_km()
+        self.ocupats.posa(id_camio, bool(camio))
+        self.amb_lloc.posa(id_camio, not ple and (limit is None or estat.km_camio(id_camio) < limit))
+        self.plens.posa(id_camio, ple)
+
+    def actualitza(self, estat, accio: CamionsOperator):
+        '''
+        Actualitza l'índex després d'haver aplicat accio a l'estat. Només es tornen a indexar els dos camions afectats.
+        '''
+        versio = self.versio + 1
+        if isinstance(accio, mourePeticio):
+            if accio.id_peticio in self.peticions:
+                self._treu(accio.id_peticio) # Si el camió destí no tenia lloc, la petició ja no és servida
+            camions = (accio.camio_origen, accio.camio_desti)
+        elif isinstance(accio, swapCentres):
+            camions = (accio.centre1, accio.centre2)
+        elif isinstance(accio, swapPeticions):
+            camions = (accio.camio1, accio.camio2)
+        else:
+            self.__init__(estat)
+            self.versio = versio
+            return
+        for id_camio in camions:
+            self._reindexa_camio(estat, id_camio)
+        self.versio = versio
+
+    def mourePeticio_aleatori(self, aleatori: random.Random, num_camions: int, estat=None,
+                              veins_propers: int = None) -> Optional[mourePeticio]:
+        '''
+        Escull uniformement un dels operadors mourePeticio de generate_all_actions: una petició servida i un camió destí
+        diferent del seu.
+        :param estat: estat indexat (només cal amb veins_propers)
+        :param veins_propers: si no és None, el camió destí s'escull entre els veins_propers més propers a la gasolinera
+            de la petició (veure StateRepresentation.camions_desti)
+        :return: l'operador, o None si no n'hi ha cap
+        '''
+        if not self.peticions or num_camions < 2:
+            return None
+        id_peticio = self.peticions.elements[aleatori.randrange(len(self.peticions))]
+        camio_origen = self.camio[id_peticio]
+        if veins_propers is not None:
+            return mourePeticio(id_peticio, camio_origen,
+                                aleatori.choice(estat.camions_desti(id_peticio, camio_origen, veins_propers)))
+        camio_desti = aleatori.randrange(num_camions - 1)
+        if camio_desti >= camio_origen:
+            camio_desti += 1
+        return mourePeticio(id_peticio, camio_origen, camio_desti)
+
+    def swapPeticions_aleatori(self, estat, aleatori: random.Random, veins_propers: int = None) -> Optional[swapPeticions]:
+        '''
+        Escull a l'atzar un operador swapPeticions entre dues peticions servides de camions diferents. Amb veins_propers,
+        el segon camió s'escull entre els propers a la primera petició i la parella només val si el primer camió també
+        és proper a la segona petició, com a StateRepresentation.deltes_swapPeticions.
+        :return: l'operador, o None si la parella escollida no forma part del veïnatge
+        '''
+        if len(self.peticions) < 2:
+            return None
+        id_peticio1 = self.peticions.elements[aleatori.randrange(len(self.peticions))]
+        camio1 = self.camio[id_peticio1]
+        if veins_propers is None:
+            id_peticio2 = self.peticions.elements[aleatori.randrange(len(self.peticions))]
+            camio2 = self.camio[id_peticio2]
+            if camio2 == camio1:
+                return None
+        else:
+            camio2 = aleatori.choice(estat.camions_desti(id_peticio1, camio1, veins_propers))
+            peticions2 = [id_peticio for viatge in estat.camions[camio2] for id_peticio in viatge]
+            if not peticions2:
+                return None
+            id_peticio2 = aleatori.choice(peticions2)
+            if camio1 not in estat.camions_desti(id_peticio2, camio2, veins_propers):
+                return None
+        return swapPeticions(id_peticio1, camio1, id_peticio2, camio2)
+
+    def accio_aleatoria(self, estat, uniforme: Callable[[], float], p_swap_centres: float = 0.3) -> Optional[CamionsOperator]:
+        '''
+        Escull a l'atzar un operador de generate_all_actions (que respecta el límit de km): amb probabilitat
+        p_swap_centres un swapCentres entre dos camions amb viatges, i si no un mourePeticio d'una petició servida a un
+        camió que la pot rebre. Els camions s'escullen dels conjunts mantinguts sense crear cap llista, de manera que només
+        es descarten les mostres que el càlcul exacte de km de es_factible rebutja (que sí que crea els viatges petits
+        que costeja i l'operador de cada mostra). Si en INTENTS_ACCIO_FACTIBLE intents no se'n troba
+        cap, es mou una petició a un camió ple (queda pendent), que sempre respecta el límit perquè només treu km.
+        :param estat: estat indexat
+        :param uniforme: funció que retorna uniformes de [0, 1) (veure font_uniforme)
+        :return: l'operador, o None si no n'hi ha cap
+        '''
+        for _ in range(INTENTS_ACCIO_FACTIBLE):
+            if uniforme() < p_swap_centres:
+                if len(self.ocupats) < 2:
+                    continue
+                centre1 = self.ocupats.escull(uniforme())
+                accio = swapCentres(centre1, self.ocupats.escull_excepte(uniforme(), centre1))
+            else:
+                if not self.peticions:
+                    continue
+                id_peticio = self.peticions.escull(uniforme())
+                camio_desti = self.amb_lloc.escull_excepte(uniforme(), self.camio[id_peticio])
+                if camio_desti is None:
+                    break
+                accio = mourePeticio(id_peticio, self.camio[id_peticio], camio_desti)
+            if estat.es_factible(accio):
+                return accio
+
+        if self.peticions:
+            id_peticio = self.peticions.escull(uniforme())
+            camio_desti = self.plens.escull_excepte(uniforme(), self.camio[id_peticio])
+            if camio_desti is not None:
+                return mourePeticio(id_peticio, self.camio[id_peticio], camio_desti)
+        return None
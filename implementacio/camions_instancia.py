@@ -0,0 +1,87 @@
+from typing import Dict, Tuple
+import numpy as np
+from .camions_distancies import DistanciesManhattan
+from .camions_viatges import CostViatges
+from .camions_espaial import IndexEspaial
+
+
+def factor_de_preu(dies: int) -> float:
+    '''
+    Factor de preu d'una petició segons els dies que fa que està pendent: 1.02 si és d'avui,
+    i si no perd un 2% per dia fins a 0.
+    '''
+    if dies == 0:
+        return 1.02
+    else: return max(0, 1-0.02 * dies)
+
+
+class InstanciaProblema(object):
+    '''
+    Dades de la instància que només depenen de ProblemParameters i no canvien durant la cerca.
+    Es construeix una sola vegada per cada ProblemParameters (veure instancia_de) i tots els estats
+    la comparteixen per referència, de manera que els estats només han de guardar l'assignació de camions.
+    '''
+
+    def __init__(self, params):
+        '''
+        Propietats (totes de només lectura):
+        - peticions_info: dies pendents de cada petició, indexat pel id global de la petició
+        - gasolinera_per_peticio: gasolinera associada a cada petició
+        - coords_gasolineres: coordenades (x, y) de cada gasolinera
+        - coords_centres: coordenades (x, y) del centre de cada camió (un camió per element de params.centres.centres)
+        - distancies: DistanciesManhattan amb les matrius de distàncies centre-gasolinera i gasolinera-gasolinera
+        - cost_viatges: CostViatges, memòria cau dels km i ingressos de cada viatge
+        '''
+        peticions_info = []
+        gasolinera_per_peticio = []
+        for id_gas, gasolinera in enumerate(params.gasolineres.gasolineres):
+            for dies in gasolinera.peticions:
+                peticions_info.append(dies)
+                gasolinera_per_peticio.append(id_gas)
+
+        self.peticions_info: Tuple[int, ...] = tuple(peticions_info)
+        self.gasolinera_per_peticio: Tuple[int, ...] = tuple(gasolinera_per_peticio)
+        self.coords_gasolineres: Tuple[Tuple[int, int], ...] = tuple((g.cx, g.cy) for g in params.gasolineres.gasolineres)
+        self.coords_centres: Tuple[Tuple[int, int], ...] = tuple((c.cx, c.cy) for c in params.centres.centres)
+
+        self.num_peticions = len(self.peticions_info)
+        self.num_camions = len(self.coords_centres)
+
+        self.distancies = DistanciesManhattan(self.coords_centres, self.coords_gasolineres)
+
+        ingressos_per_peticio = tuple(params.valor * factor_de_preu(dies) for dies in self.peticions_info)
+        self.cost_viatges = CostViatges(self.distancies, self.gasolinera_per_peticio, ingressos_per_peticio)
+
+        self._index_centres = None # IndexEspaial sobre el centre de cada camió, es construeix la primera vegada que cal
+        self._camions_propers: Dict[int, np.ndarray] = {} # Llistes de candidats ja calculades, per nombre de camions
+
+    def camions_propers(self, k: int) -> np.ndarray:
+        '''
+        Per cada gasolinera, els k + 1 camions amb el centre més proper (de més a menys proper, els empats per id).
+        Se'n guarda un de més perquè a una petició li quedin k camions destí encara que el seu camió sigui entre els propers.
+        Es calcula amb un IndexEspaial sobre els centres i es guarda per cada k.
+        :return: array (gasolineres x min(k + 1, camions))
+        '''
+        if k not in self._camions_propers:
+            if self._index_centres is None:
+                self._index_centres = IndexEspaial(self.coords_centres)
+            n = min(k + 1, self.num_camions)
+            self._camions_propers[k] = np.array([self._index_centres.mes_propers(x, y, n) for x, y in self.coords_gasolineres],
+                                                dtype=np.intp).reshape(len(self.coords_gasolineres), n)
+        return self._camions_propers[k]
+
+    def __repr__(self):
+        return f"InstanciaProblema(peticions={self.num_peticions}, gasolineres={len(self.coords_gasolineres)}, camions={self.num_camions})"
+
+
+def instancia_de(params) -> InstanciaProblema:
+    '''
+    Retorna la instància associada als paràmetres, construint-la només la primera vegada.
+    :param params: paràmetres del problema
+    :return: InstanciaProblema compartida per tots els estats d'aquests paràmetres
+    '''
+    instancia = getattr(params, '_instancia', None)
+    if instancia is None:
+        instancia = InstanciaProblema(params)
+        params._instancia = instancia
+    return instancia
@@ -0,0 +1,282 @@
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, List, Union
+import numpy as np
+
+from .abia_Gasolina import Gasolinera, Distribucio
+from .camions_parametres import ProblemParameters
+from .camions_instancia import instancia_de
+from .camions_estat import (StateRepresentation, generate_greedy_initial_state, generate_initial_state,
+                            generate_empty_initial_state, generate_random_initial_state,
+                            generate_regret_initial_state)
+from .camions_codificacio import InstantaniaViatges
+from .camions_cerca import ResultatCerca, cerca_hill_climbing, cerca_simulated_annealing
+
+
+# Generadors d'estat inicial que es poden demanar pel nom a Inici
+GENERADORS = {
+    'greedy': generate_greedy_initial_state,
+    'ordenat': generate_initial_state,
+    'buit': generate_empty_initial_state,
+    'aleatori': generate_random_initial_state,
+    'regret': generate_regret_initial_state,
+}
+
+
+class Inici(object):
+    '''
+    Descripció d'un punt de partida de la cerca multi-inici.
+    '''
+
+    def __init__(self, generador: Union[str, Callable] = 'greedy', perturbacions: int = 0, seed: int = 0):
+        '''
+        :param generador: nom d'un generador de GENERADORS, o funció (params) -> StateRepresentation
+            (ha de ser una funció de mòdul perquè s'enviï als processos)
+        :param perturbacions: nombre de mourePeticio aleatoris que s'apliquen a l'estat generat
+        :param seed: llavor de les perturbacions, del generador 'aleatori' i dels desempats de la cerca
+        '''
+        self.generador = generador
+        self.perturbacions = perturbacions
+        self.seed = seed
+
+    def genera(self, params) -> StateRepresentation:
+        '''
+        Construeix l'estat inicial que descriu aquest punt de partida.
+        '''
+        if self.generador == 'aleatori':
+            estat = generate_random_initial_state(params, self.seed)
+        elif isinstance(self.generador, str):
+            estat = GENERADORS[self.generador](params)
+        else:
+            estat = self.generador(params)
+
+        aleatori = random.Random(self.seed)
+        index = estat.index_veinatge()
+        for _ in range(self.perturbacions):
+            accio = index.mourePeticio_aleatori(aleatori, len(estat.camions))
+            if accio is None:
+                break
+            estat.aplicar_in_situ(accio)
+        return estat
+
+    def __repr__(self):
+        nom = self.generador if isinstance(self.generador, str) else getattr(self.generador, '__name__', repr(self.generador))
+        return f"Inici(generador={nom}, perturbacions={self.perturbacions}, seed={self.seed})"
+
+
+class ResultatMultiInici(object):
+    '''
+    Resultat de hill_climbing_multi_inici: el millor estat i el ResultatCerca de cada punt de partida
+    (en el mateix ordre que els inicis).
+    '''
+
+    def __init__(self, estat: StateRepresentation, benefici: float, resultats: List[ResultatCerca], inicis: List[Inici]):
+        self.estat = estat
+        self.benefici = benefici
+        self.resultats = resultats
+        self.inicis = inicis
+
+    def __repr__(self):
+        return f"ResultatMultiInici(benefici={self.benefici}, inicis={len(self.inicis)})"
+
+
+def empaqueta_parametres(params) -> tuple:
+    '''
+    Representació mínima dels paràmetres per enviar-los a altres processos:
+    només els límits i costos, les coordenades i peticions de les gasolineres i les coordenades dels centres.
+    '''
+    gasolineres = tuple((g.cx, g.cy, tuple(g.peticions)) for g in params.gasolineres.gasolineres)
+    centres = tuple((c.cx, c.cy, c.diposit) for c in params.centres.centres)
+    return (getattr(params, 'km', None), params.n_viatges, params.valor, params.cost_km, gasolineres, centres)
+
+
+def desempaqueta_parametres(dades: tuple) -> ProblemParameters:
+    '''
+    Reconstrueix uns ProblemParameters a partir de empaqueta_parametres.
+    '''
+    km, n_viatges, valor, cost_km, gasolineres, centres = dades
+    return ProblemParameters(
+        km=km,
+        n_viatges=n_viatges,
+        valor=valor,
+        cost_km=cost_km,
+        gasolineres=SimpleNamespace(gasolineres=[Gasolinera(cx, cy, list(peticions)) for cx, cy, peticions in gasolineres]),
+        centres=SimpleNamespace(centres=[Distribucio(cx, cy, diposit) for cx, cy, diposit in centres]),
+    )
+
+
+def codifica(estat: StateRepresentation) -> np.ndarray:
+    '''
+    Array compacte (InstantaniaViatges) amb els viatges de l'estat, per enviar-lo entre processos.
+    '''
+    return InstantaniaViatges.d_estat(estat).viatges
+
+
+def descodifica(params, viatges: np.ndarray) -> StateRepresentation:
+    '''
+    Reconstrueix l'estat a partir de l'array de codifica.
+    '''
+    return InstantaniaViatges(viatges, len(instancia_de(params).peticions_info)).a_estat(params)
+
+
+# Paràmetres del procés treballador, es construeixen una sola vegada per procés
+_params_treballador = None
+
+
+def _inicialitza_treballador(dades_params: tuple):
+    global _params_treballador
+    _params_treballador = desempaqueta_parametres(dades_params)
+
+
+def _executa_inici(inici: Inici, opcions: dict):
+    '''
+    Executa la cerca des d'un punt de partida dins d'un procés treballador.
+    Retorna l'estat final codificat (no l'estat sencer) i les estadístiques.
+    '''
+    estat = inici.genera(_params_treballador)
+    # Amb la llavor de l'inici la cerca resol els empats amb el seu propi generador: el resultat no depèn del procés
+    # i, amb processos=1, no es toca el generador global de random de qui crida
+    resultat = cerca_hill_climbing(estat, **{'seed': inici.seed, **opcions})
+    viatges = codifica(resultat.estat)
+    resultat.estat = None
+    return viatges, resultat
+
+
+def hill_climbing_multi_inici(params, inicis: List[Inici], processos: int = None, **opcions) -> ResultatMultiInici:
+    '''
+    Executa cerca_hill_climbing des de cada punt de partida en paral·lel amb un ProcessPoolExecutor.
+    Als processos només s'envien els paràmetres empaquetats (una vegada per procés) i la descripció de cada inici,
+    i en tornen només l'estat final codificat amb InstantaniaViatges i les estadístiques.
+    :param params: paràmetres del problema
+    :param inicis: punts de partida (Inici, o noms de GENERADORS)
+    :param processos: nombre de processos (per defecte os.cpu_count()); amb 1 s'executa tot en el procés actual
+    :param opcions: paràmetres de cerca_hill_climbing (mode, max_iteracions, temps_maxim, ...)
+    :return: ResultatMultiInici amb el millor estat i les estadístiques de cada inici
+    '''
+    inicis = [inici if isinstance(inici, Inici) else Inici(inici) for inici in inicis]
+    dades_params = empaqueta_parametres(params)
+    processos = processos or os.cpu_count() or 1
+
+    if processos == 1:
+        _inicialitza_treballador(dades_params)
+        sortides = [_executa_inici(inici, opcions) for inici in inicis]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(inicis)), initializer=_inicialitza_treballador,
+                                 initargs=(dades_params,)) as executor:
+            sortides = list(executor.map(_executa_inici, inicis, [opcions] * len(inicis)))
+
+    resultats = []
+    for viatges, resultat in sortides:
+        resultat.estat = descodifica(params, viatges)
+        resultats.append(resultat)
+
+    millor = max(resultats, key=lambda r: r.benefici)
+    return ResultatMultiInici(millor.estat, millor.benefici, resultats, inicis)
+
+
+class ResultatTempering(object):
+    '''
+    Resultat de parallel_tempering: el millor estat trobat per qualsevol rèplica i estadístiques de les rèpliques.
+    '''
+
+    def __init__(self, temperatures: List[float]):
+        self.estat = None
+        self.benefici = None
+        self.temperatures = temperatures                       # Temperatura de cada rèplica, de més freda a més calenta
+        self.beneficis_finals = [None] * len(temperatures)    # Benefici de l'estat de cada rèplica en acabar
+        self.intents_intercanvi = [0] * (len(temperatures) - 1)   # Intents d'intercanvi entre la rèplica i i la i+1
+        self.intercanvis = [0] * (len(temperatures) - 1)          # Intercanvis acceptats entre la rèplica i i la i+1
+        self.rondes = 0
+
+    def __repr__(self):
+        return f"ResultatTempering(benefici={self.benefici}, repliques={len(self.temperatures)}, rondes={self.rondes}, intercanvis={self.intercanvis})"
+
+
+def temperatures_geometriques(t_min: float, t_max: float, repliques: int) -> List[float]:
+    '''
+    Escala geomètrica de temperatures entre t_min i t_max, de més freda a més calenta.
+    '''
+    if repliques == 1:
+        return [t_min]
+    return [t_min * (t_max / t_min) ** (i / (repliques - 1)) for i in range(repliques)]
+
+
+def _executa_replica(viatges: np.ndarray, temperatura: float, passos: int, seed: int):
+    '''
+    Fa passos iteracions de Simulated Annealing a temperatura constant des de l'estat donat, dins d'un procés treballador.
+    Retorna l'estat final i el millor estat vist, codificats, amb els seus beneficis.
+    '''
+    estat = descodifica(_params_treballador, viatges)
+    resultat = cerca_simulated_annealing(estat, schedule=lambda t: temperatura if t < passos else 0, seed=seed)
+    return codifica(resultat.estat_final), resultat.benefici_final, codifica(resultat.estat), resultat.benefici
+
+
+def parallel_tempering(params, estat_inicial: StateRepresentation = None, repliques: int = 4, t_min: float = 1,
+                       t_max: float = 100, temperatures: List[float] = None, passos_per_ronda: int = 1000,
+                       rondes: int = 50, processos: int = None, seed: int = 0) -> ResultatTempering:
+    '''
+    Simulated Annealing amb intercanvi de rèpliques (parallel tempering): cada rèplica fa Simulated Annealing a una
+    temperatura fixa en un procés diferent i, després de cada ronda, les rèpliques de temperatures veïnes
+    intercanvien els seus estats amb probabilitat min(1, exp((1/T_i - 1/T_j) * (B_j - B_i))).
+    Entre processos només viatja l'estat de cada rèplica codificat amb InstantaniaViatges.
+    :param params: paràmetres del problema
+    :param estat_inicial: estat des d'on comencen totes les rèpliques (per defecte generate_greedy_initial_state)
+    :param repliques: nombre de rèpliques, si no es donen les temperatures
+    :param t_min, t_max: temperatures extremes de l'escala geomètrica, si no es donen les temperatures
+    :param temperatures: temperatura de cada rèplica
+    :param passos_per_ronda: iteracions de Simulated Annealing de cada rèplica entre intercanvis
+    :param rondes: nombre de rondes
+    :param processos: nombre de processos (per defecte una per rèplica fins a os.cpu_count()); amb 1 no es creen processos
+    :param seed: llavor dels intercanvis i de les rèpliques
+    :return: ResultatTempering amb el millor estat trobat
+    '''
+    temperatures = temperatures or temperatures_geometriques(t_min, t_max, repliques)
+    estat_inicial = estat_inicial or generate_greedy_initial_state(params)
+    aleatori = random.Random(seed)
+
+    resultat = ResultatTempering(temperatures)
+    viatges = [codifica(estat_inicial)] * len(temperatures)
+    beneficis = [-estat_inicial.heuristica()] * len(temperatures)
+    resultat.benefici = beneficis[0]
+    millors_viatges = viatges[0]
+
+    dades_params = empaqueta_parametres(params)
+    processos = min(processos or os.cpu_count() or 1, len(temperatures))
+    executor = None
+    if processos == 1:
+        _inicialitza_treballador(dades_params)
+        executa = map
+    else:
+        executor = ProcessPoolExecutor(max_workers=processos, initializer=_inicialitza_treballador, initargs=(dades_params,))
+        executa = executor.map
+
+    try:
+        for ronda in range(rondes):
+            llavors = [aleatori.randrange(2 ** 32) for _ in temperatures]
+            sortides = list(executa(_executa_replica, viatges, temperatures, [passos_per_ronda] * len(temperatures), llavors))
+            for i, (viatges_final, benefici_final, viatges_millor, benefici_millor) in enumerate(sortides):
+                viatges[i] = viatges_final
+                beneficis[i] = benefici_final
+                if benefici_millor > resultat.benefici:
+                    resultat.benefici = benefici_millor
+                    millors_viatges = viatges_millor
+
+            # Intercanvis entre temperatures veïnes, alternant parelles parelles i senars a cada ronda
+            for i in range(ronda % 2, len(temperatures) - 1, 2):
+                resultat.intents_intercanvi[i] += 1
+                exponent = (1 / temperatures[i] - 1 / temperatures[i + 1]) * (beneficis[i + 1] - beneficis[i])
+                if exponent >= 0 or aleatori.random() < math.exp(exponent):
+                    viatges[i], viatges[i + 1] = viatges[i + 1], viatges[i]
+                    beneficis[i], beneficis[i + 1] = beneficis[i + 1], beneficis[i]
+                    resultat.intercanvis[i] += 1
+            resultat.rondes += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    resultat.estat = descodifica(params, millors_viatges)
+    resultat.beneficis_finals = beneficis
+    return resultat
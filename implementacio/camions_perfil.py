@@ -0,0 +1,234 @@
+import cProfile
+import functools
+import gc
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from .camions_estat import StateRepresentation
+from .camions_veinatge import AvaluadorMourePeticio
+
+
+# Components del benefici que es cronometren: nom a EstadistiquesCerca.temps_components -> mètode de StateRepresentation
+COMPONENTS_COST = {
+    'ingressos': 'calcular_ingressos_servits',
+    'cost_km': 'calcular_cost_km',
+    'penalitzacio': 'calcular_penalitzacio_pendents',
+}
+
+# Mètodes de StateRepresentation que recorren el veïnatge (una entrada de veins_per_iteracio per crida)
+RECORREGUTS = ('generate_all_actions', 'generate_actions_lazy', 'millor_accio', 'millors_swapPeticions')
+# Mètodes de StateRepresentation que calculen les deltes dels veïns
+GENERADORS_DELTES = ('deltes_mourePeticio', 'deltes_swapPeticions', 'delta_si_factible')
+
+
+class EstadistiquesCerca(object):
+    '''
+    Comptadors i temps recollits per instrumenta durant una execució.
+    '''
+
+    def __init__(self):
+        self.crides_apply_action = 0           # Estats creats amb apply_action
+        self.crides_copy = 0                   # Còpies d'estat (_copy)
+        self.crides_heuristica = 0             # Crides a heuristica
+        self.heuristiques_completes = 0        # Crides a heuristica que han hagut de calcular el benefici sencer
+        self.veins_avaluats = 0                # Veïns generats o avaluats amb deltes, per qualsevol camí de cerca
+        self.veins_per_iteracio: List[int] = [] # Veïns de cada recorregut del veïnatge (una entrada per recorregut, veure instrumenta)
+        self.temps_components: Dict[str, float] = {nom: 0.0 for nom in COMPONENTS_COST} # Segons dins de cada component del benefici
+        self.col_leccions_gc = 0               # Passades del recol·lector d'escombraries de Python
+        self.temps_gc = 0.0                    # Segons dins del recol·lector (amb milers de veïns vius pot dominar el temps de _copy)
+        self.temps = 0.0                       # Temps total en segons
+        self.perfil = None                     # pstats.Stats de l'execució, si s'ha demanat
+
+    def resum(self) -> dict:
+        '''
+        Estadístiques com a diccionari pla (per desar-les en JSON o CSV). Si no s'ha recorregut cap veïnatge sencer
+        (Simulated Annealing natiu, que sorteja els veïns d'un en un), iteracions i veins_mitjana són None: els passos
+        d'aquesta cerca són a ResultatCerca.
+        '''
+        iteracions = len(self.veins_per_iteracio) or None
+        return {
+            'crides_apply_action': self.crides_apply_action,
+            'crides_copy': self.crides_copy,
+            'crides_heuristica': self.crides_heuristica,
+            'heuristiques_completes': self.heuristiques_completes,
+            'iteracions': iteracions,
+            'veins_totals': self.veins_avaluats,
+            'veins_mitjana': sum(self.veins_per_iteracio) / iteracions if iteracions else None,
+            **{f'temps_{nom}': segons for nom, segons in self.temps_components.items()},
+            'col_leccions_gc': self.col_leccions_gc,
+            'temps_gc': self.temps_gc,
+            'temps': self.temps,
+        }
+
+    def __repr__(self):
+        return (f"EstadistiquesCerca(apply_action={self.crides_apply_action}, copy={self.crides_copy}, "
+                f"heuristica={self.crides_heuristica} ({self.heuristiques_completes} completes), "
+                f"iteracions={len(self.veins_per_iteracio) or None}, veins={self.veins_avaluats}, "
+                f"gc={self.temps_gc:.3f}s, temps={self.temps:.3f}s)")
+
+
+def _compta(metode, comptador: str, estadistiques: EstadistiquesCerca):
+    @functools.wraps(metode)
+    def embolcall(*args, **kwargs):
+        setattr(estadistiques, comptador, getattr(estadistiques, comptador) + 1)
+        return metode(*args, **kwargs)
+    return embolcall
+
+
+def _cronometra(metode, component: str, estadistiques: EstadistiquesCerca):
+    @functools.wraps(metode)
+    def embolcall(*args, **kwargs):
+        inici = time.perf_counter()
+        try:
+            return metode(*args, **kwargs)
+        finally:
+            estadistiques.temps_components[component] += time.perf_counter() - inici
+    return embolcall
+
+
+@contextmanager
+def instrumenta(perfil: str = None):
+    '''
+    Instrumenta StateRepresentation mentre dura el bloc with: compta les crides a apply_action, _copy i heuristica,
+    els veïns de cada iteració, el temps dins de cada component del benefici i el temps del recol·lector d'escombraries. Els mètodes originals es restauren
+    en sortir, de manera que fora del bloc la cerca no paga res. Compta tant les cerques d'aima com les natives
+    (camions_cerca), però només dins del procés actual.
+
+    Els veïns es compten allà on es generen o se'n calcula la delta: generate_all_actions i generate_actions_lazy
+    (cerques d'aima), deltes_mourePeticio i deltes_swapPeticions (puntua_i_aplica de CamionsProblema i el mode 'first'
+    de cerca_hill_climbing), AvaluadorMourePeticio.millor_accio (mode 'steepest') i delta_si_factible (Simulated
+    Annealing natiu). Cada recorregut del veïnatge (una crida de generate_all_actions, generate_actions_lazy, millor_accio
+    o millors_swapPeticions, o un recorregut de deltes_* fet directament per la cerca) afegeix una entrada a
+    veins_per_iteracio; els veïns que el Simulated Annealing natiu sorteja d'un en un només sumen a veins_avaluats,
+    i aquesta cerca no deixa cap entrada (el resum en dona les iteracions com a None).
+    :param perfil: si no és None, també s'executa el bloc amb cProfile i es desa el perfil (pstats) en aquest fitxer
+    :return: EstadistiquesCerca, que s'omple quan acaba el bloc
+
+    Exemple:
+        with instrumenta('hc.pstats') as estadistiques:
+            hill_climbing(CamionsProblema(estat_inicial))
+        print(estadistiques.resum())
+    '''
+    estadistiques = EstadistiquesCerca()
+    originals = {nom: StateRepresentation.__dict__[nom] for nom in
+                 ('apply_action', '_copy', 'heuristica', *RECORREGUTS, *GENERADORS_DELTES, *COMPONENTS_COST.values())}
+    millor_accio = AvaluadorMourePeticio.millor_accio
+    heuristica = originals['heuristica']
+    delta_si_factible = originals['delta_si_factible']
+    recorreguts_oberts = [0] # Recorreguts del veïnatge en curs: només el més exterior afegeix una entrada
+    enumeracions_obertes = [0] # generate_all_actions o generate_actions_lazy en curs, que ja compten els veïns que generen
+
+    def obre_recorregut():
+        recorreguts_oberts[0] += 1
+        return estadistiques.veins_avaluats
+
+    def tanca_recorregut(veins_abans: int):
+        recorreguts_oberts[0] -= 1
+        if recorreguts_oberts[0] == 0:
+            estadistiques.veins_per_iteracio.append(estadistiques.veins_avaluats - veins_abans)
+
+    @functools.wraps(heuristica)
+    def heuristica_comptada(self):
+        estadistiques.crides_heuristica += 1
+        if self._benefici is None:
+            estadistiques.heuristiques_completes += 1
+        return heuristica(self)
+
+    def enumeracio_comptada(generador):
+        # generate_all_actions i generate_actions_lazy: cada operador generat és un veí
+        @functools.wraps(generador)
+        def embolcall(self, *args, **kwargs):
+            veins_abans = obre_recorregut()
+            enumeracions_obertes[0] += 1
+            try:
+                for accio in generador(self, *args, **kwargs):
+                    estadistiques.veins_avaluats += 1
+                    yield accio
+            finally:
+                enumeracions_obertes[0] -= 1
+                tanca_recorregut(veins_abans)
+        return embolcall
+
+    def deltes_comptades(generador):
+        # deltes_mourePeticio i deltes_swapPeticions: cada delta calculada és un veí, si no la compta ja una enumeració
+        @functools.wraps(generador)
+        def embolcall(self, *args, **kwargs):
+            veins_abans = obre_recorregut()
+            try:
+                for deltes in generador(self, *args, **kwargs):
+                    if not enumeracions_obertes[0]:
+                        estadistiques.veins_avaluats += 1
+                    yield deltes
+            finally:
+                tanca_recorregut(veins_abans)
+        return embolcall
+
+    def recorregut_comptat(metode):
+        # Mètodes que recorren el veïnatge amb deltes_*: els veïns ja es compten a dins
+        @functools.wraps(metode)
+        def embolcall(self, *args, **kwargs):
+            veins_abans = obre_recorregut()
+            try:
+                return metode(self, *args, **kwargs)
+            finally:
+                tanca_recorregut(veins_abans)
+        return embolcall
+
+    @functools.wraps(delta_si_factible)
+    def delta_si_factible_comptada(self, action):
+        estadistiques.veins_avaluats += 1
+        return delta_si_factible(self, action)
+
+    @functools.wraps(millor_accio)
+    def millor_accio_comptada(self, *args, **kwargs):
+        veins_abans = obre_recorregut()
+        try:
+            resultat = millor_accio(self, *args, **kwargs)
+            estadistiques.veins_avaluats += self.ultim_nombre_veins
+            return resultat
+        finally:
+            tanca_recorregut(veins_abans)
+
+    StateRepresentation.apply_action = _compta(originals['apply_action'], 'crides_apply_action', estadistiques)
+    StateRepresentation._copy = _compta(originals['_copy'], 'crides_copy', estadistiques)
+    StateRepresentation.heuristica = heuristica_comptada
+    for nom in ('generate_all_actions', 'generate_actions_lazy'):
+        setattr(StateRepresentation, nom, enumeracio_comptada(originals[nom]))
+    for nom in ('deltes_mourePeticio', 'deltes_swapPeticions'):
+        setattr(StateRepresentation, nom, deltes_comptades(originals[nom]))
+    for nom in ('millor_accio', 'millors_swapPeticions'):
+        setattr(StateRepresentation, nom, recorregut_comptat(originals[nom]))
+    StateRepresentation.delta_si_factible = delta_si_factible_comptada
+    for component, nom in COMPONENTS_COST.items():
+        setattr(StateRepresentation, nom, _cronometra(originals[nom], component, estadistiques))
+    AvaluadorMourePeticio.millor_accio = millor_accio_comptada
+
+    inici_gc = [0.0]
+
+    def cronometra_gc(fase, info):
+        if fase == 'start':
+            inici_gc[0] = time.perf_counter()
+        else:
+            estadistiques.col_leccions_gc += 1
+            estadistiques.temps_gc += time.perf_counter() - inici_gc[0]
+    gc.callbacks.append(cronometra_gc)
+
+    perfilador = cProfile.Profile() if perfil is not None else None
+    inici = time.perf_counter()
+    try:
+        if perfilador is not None:
+            perfilador.enable()
+        yield estadistiques
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+        estadistiques.temps = time.perf_counter() - inici
+        gc.callbacks.remove(cronometra_gc)
+        for nom, metode in originals.items():
+            setattr(StateRepresentation, nom, metode)
+        AvaluadorMourePeticio.millor_accio = millor_accio
+        if perfilador is not None:
+            perfilador.dump_stats(perfil)
+            estadistiques.perfil = pstats.Stats(perfilador)
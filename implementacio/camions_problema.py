@@ -2,20 +2,59 @@ from typing import Generator
 from .camions_operadors import CamionsOperator
 from aima3.search import Problem
 from .camions_estat import StateRepresentation
+from .camions_index import font_uniforme
+
+
+ACCIONS = ('totes', 'mostra')
 
 class CamionsProblema(Problem):
     '''
     Definició del problema dels camions com a problema de cerca.
     '''
 
-    def __init__(self, initial_state: StateRepresentation):
+    def __init__(self, initial_state: StateRepresentation, puntua_i_aplica: bool = False, veins_propers: int = None,
+                 swap_peticions: bool = False, accions: str = 'totes', mida_mostra: int = 50, aleatori=None):
+        '''
+        :param initial_state: estat inicial
+        :param puntua_i_aplica: si és cert, actions() puntua tots els veïns amb deltes sense crear-los
+            i només retorna el millor operador, de manera que hill_climbing només materialitza l'estat guanyador.
+            Pensat per Hill Climbing: amb Simulated Annealing faria que sempre s'escollís el millor veí.
+        :param veins_propers: si no és None, veïnatge amb llista de candidats: cada petició només es mou als
+            veins_propers camions amb el centre més proper a la seva gasolinera
+        :param swap_peticions: si és cert, el veïnatge també inclou swapPeticions
+        :param accions: 'totes' (tot el veïnatge, generate_all_actions) o 'mostra' (mida_mostra accions aleatòries,
+            generate_actions_lazy); amb 'mostra' el veí que s'expandeix pren l'índex de veïnatge del seu pare
+            en lloc de reconstruir-lo, i els veïns que només s'avaluen no el copien
+        :param mida_mostra: accions de cada mostra; amb simulated_annealing de aima n'hi ha prou amb 1,
+            perquè en crea tots els veïns per escollir-ne un
+        :param aleatori: random.Random o np.random.Generator de les mostres (None pel generador global del mòdul random)
+        '''
+        if accions not in ACCIONS:
+            raise ValueError(f"Accions desconegudes: {accions}. Les vàlides són {ACCIONS}")
         super().__init__(initial_state)
+        self.puntua_i_aplica = puntua_i_aplica
+        self.veins_propers = veins_propers
+        self.swap_peticions = swap_peticions
+        self.accions = accions
+        self.mida_mostra = mida_mostra
+        self._uniforme = font_uniforme(aleatori)
 
     def actions(self, state: StateRepresentation) -> Generator[CamionsOperator, None, None]:
+        if self.puntua_i_aplica:
+            accio, delta = state.millor_accio(self.veins_propers)
+            if self.swap_peticions:
+                for swap, delta_swap in state.millors_swapPeticions(1, self.veins_propers):
+                    if accio is None or delta_swap > delta:
+                        accio = swap
+            return [accio] if accio is not None else []
+        if self.accions == 'mostra':
+            return state.generate_actions_lazy(self._uniforme, self.mida_mostra)
+        if self.veins_propers is not None or self.swap_peticions:
+            return state.generate_all_actions(self.veins_propers, self.swap_peticions)
         return state.generate_all_actions()
 
     def result(self, state: StateRepresentation, action: CamionsOperator) -> StateRepresentation:
-        return state.apply_action(action)
+        return state.apply_action(action, hereta_index=self.accions == 'mostra')
 
     def value(self, state: StateRepresentation) -> float:
         return -state.heuristica()
@@ -0,0 +1,189 @@
+import random
+from typing import Optional, Tuple
+import numpy as np
+
+from .camions_estat import StateRepresentation
+from .camions_operadors import mourePeticio
+
+
+class AvaluadorMourePeticio(object):
+    '''
+    Avalua de cop tot el veïnatge mourePeticio d'un estat (cada petició servida cap a cada altre camió)
+    amb operacions de numpy sobre els costos de cada viatge, sense crear cap operador ni cap estat intermedi.
+    Aplica les mateixes regles que StateRepresentation.apply_action, de manera que les deltes coincideixen
+    exactament amb les de StateRepresentation.delta_benefici. Els operadors que passarien el camió destí del
+    límit de km (veure StateRepresentation.es_factible) reben delta -inf i no s'escullen mai.
+    Es construeix una vegada per instància i es pot reutilitzar per tots els estats de la cerca.
+    '''
+
+    def __init__(self, estat: StateRepresentation, veins_propers: int = None):
+        '''
+        :param estat: qualsevol estat de la instància
+        :param veins_propers: si no és None, cada petició només es mou als veins_propers camions amb el centre més proper
+            a la seva gasolinera (veure StateRepresentation.camions_desti), i cada avaluació és O(peticions x veins_propers)
+        '''
+        self.distancies = estat.instancia.distancies
+        self.cost_km = estat.params.cost_km
+        self.n_viatges = estat.params.n_viatges
+        self.num_camions = estat.instancia.num_camions
+        self.limit_km = estat.limit_km()
+        self.veins_propers = veins_propers
+        self.camions_propers = estat.instancia.camions_propers(veins_propers) if veins_propers is not None else None
+
+        self.gasolinera = np.array(estat.gasolinera_per_peticio, dtype=np.intp) # gasolinera de cada petició
+        self.valor_servir = np.array([estat._valor_servir(i) for i in range(len(estat.peticions_info))], dtype=np.float64)
+        self.ultim_nombre_veins = 0 # Nombre d'operadors avaluats a l'última crida de deltes
+
+    def _recull(self, estat: StateRepresentation):
+        '''
+        Recorre els viatges de l'estat i calcula la delta de treure cada petició servida del seu viatge.
+        :return: (peticions, origens, delta_treure, ultima_gasolinera, viatge_nou), on per cada camió ultima_gasolinera
+            és la gasolinera de l'últim viatge si hi cap una petició més (-1 si no) i viatge_nou indica si pot fer un viatge nou
+        '''
+        cg = self.distancies.centre_gasolinera
+
+        # Peticions servides: camió origen i l'altra petició del mateix viatge (-1 si viatja sola)
+        peticions, origens, altres = [], [], []
+        ultima_gasolinera = np.full(self.num_camions, -1, dtype=np.intp)
+        viatge_nou = np.zeros(self.num_camions, dtype=bool)
+
+        for id_camio, viatges in enumerate(estat.camions):
+            for viatge in viatges:
+                for posicio, id_peticio in enumerate(viatge):
+                    peticions.append(id_peticio)
+                    origens.append(id_camio)
+                    altres.append(viatge[1 - posicio] if len(viatge) == 2 else -1)
+            if viatges and len(viatges[-1]) < 2:
+                ultima_gasolinera[id_camio] = self.gasolinera[viatges[-1][0]]
+            elif not viatges or len(viatges) < self.n_viatges:
+                viatge_nou[id_camio] = True
+
+        peticions = np.array(peticions, dtype=np.intp)
+        origens = np.array(origens, dtype=np.intp)
+        altres = np.array(altres, dtype=np.intp)
+
+        # Km que s'estalvien traient cada petició del seu viatge
+        g = self.gasolinera[peticions]
+        te_altra = altres >= 0
+        g_altra = self.gasolinera[np.where(te_altra, altres, peticions)]
+        km_viatge = np.where(te_altra,
+                             cg[origens, g].astype(np.int64) + self.distancies.entre_gasolineres_array(g, g_altra) + cg[origens, g_altra],
+                             2 * cg[origens, g].astype(np.int64))
+        km_reduit = np.where(te_altra, 2 * cg[origens, g_altra].astype(np.int64), 0)
+        delta_treure = -(km_reduit - km_viatge) * self.cost_km
+        return peticions, origens, delta_treure, ultima_gasolinera, viatge_nou
+
+    def _delta_afegir(self, estat: StateRepresentation, destins: np.ndarray, peticions: np.ndarray,
+                      ultima_gasolinera: np.ndarray, viatge_nou: np.ndarray) -> np.ndarray:
+        '''
+        Delta d'afegir cada petició a cada camió destí: a l'últim viatge, en un viatge nou, o la petició queda pendent
+        si no hi cap. destins és un array de camions que es combina (broadcast) amb peticions[None, :].
+        Si hi ha límit de km, els destins on no hi cap la petició sense passar-se'n reben -inf.
+        '''
+        cg = self.distancies.centre_gasolinera
+        g = self.gasolinera[peticions][None, :]
+        cg_desti = cg[destins, g].astype(np.int64)
+        te_ultim = (ultima_gasolinera >= 0)[destins]
+        g_ultim = np.where(ultima_gasolinera >= 0, ultima_gasolinera, 0)[destins]
+        km_ultim = self.distancies.entre_gasolineres_array(g_ultim, g) + cg_desti - cg[destins, g_ultim].astype(np.int64)
+        delta = np.where(te_ultim, -km_ultim * self.cost_km,
+                         np.where(viatge_nou[destins], -2 * cg_desti * self.cost_km, -self.valor_servir[peticions][None, :]))
+        if self.limit_km is not None:
+            km_afegits = np.where(te_ultim, km_ultim, np.where(viatge_nou[destins], 2 * cg_desti, 0))
+            km_camions = np.array(estat._km_camions())
+            delta = np.where((km_afegits > 0) & (km_camions[destins] + km_afegits > self.limit_km), -np.inf, delta)
+        return delta
+
+    def deltes(self, estat: StateRepresentation) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Calcula la delta de benefici de tots els operadors mourePeticio de l'estat (sense llista de candidats).
+        :return: (peticions, camions_origen, deltes), on deltes[d, j] és la delta de moure peticions[j]
+            del camió camions_origen[j] al camió d (-inf si d és el camió origen)
+        '''
+        peticions, origens, delta_treure, ultima_gasolinera, viatge_nou = self._recull(estat)
+        if not len(peticions):
+            self.ultim_nombre_veins = 0
+            return peticions, origens, np.empty((self.num_camions, 0))
+
+        destins = np.arange(self.num_camions)[:, None]
+        deltes = delta_treure[None, :] + self._delta_afegir(estat, destins, peticions, ultima_gasolinera, viatge_nou)
+        deltes[origens, np.arange(len(peticions))] = -np.inf
+        self.ultim_nombre_veins = len(peticions) * (self.num_camions - 1)
+        return peticions, origens, deltes
+
+    def deltes_candidats(self, estat: StateRepresentation) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Com deltes, però només cap als veins_propers camions més propers a cada petició.
+        :return: (peticions, camions_origen, destins, deltes), on destins[i, j] és l'i-èsim camió candidat
+            de peticions[j] (de més a menys proper) i deltes[i, j] la delta de moure-la-hi
+        '''
+        peticions, origens, delta_treure, ultima_gasolinera, viatge_nou = self._recull(estat)
+        k = min(self.veins_propers, self.num_camions - 1)
+        if not len(peticions) or k <= 0:
+            self.ultim_nombre_veins = 0
+            buit = np.empty((0, len(peticions)))
+            return peticions, origens, buit.astype(np.intp), buit
+
+        # Candidats de cada petició sense el seu camió: el camió origen passa al final i es descarta
+        propers = self.camions_propers[self.gasolinera[peticions]]
+        ordre = np.argsort(propers == origens[:, None], axis=1, kind='stable')[:, :k]
+        destins = np.take_along_axis(propers, ordre, axis=1).T
+        deltes = delta_treure[None, :] + self._delta_afegir(estat, destins, peticions, ultima_gasolinera, viatge_nou)
+        self.ultim_nombre_veins = deltes.size
+        return peticions, origens, destins, deltes
+
+    def millor_accio(self, estat: StateRepresentation, desempat_aima: bool = False,
+                     aleatori: random.Random = None) -> Tuple[Optional[mourePeticio], Optional[float]]:
+        '''
+        Millor operador mourePeticio de l'estat. Els empats es resolen a l'atzar, com a StateRepresentation.millor_accio.
+        :param desempat_aima: si és cert, els empats es resolen consumint els nombres aleatoris exactament com
+            argmax_random_tie d'aima sobre generate_all_actions, de manera que amb la mateixa llavor de random
+            s'obté el mateix camí que aima3.search.hill_climbing. És més lent: barreja tot el veïnatge.
+        :param aleatori: generador amb què es resolen els empats (per defecte el generador global de random, com aima)
+        :return: parella (operador, delta de benefici), o (None, None) si no hi ha cap operador aplicable
+        '''
+        aleatori = aleatori or random # El mòdul random fa servir el generador global
+        if self.veins_propers is not None:
+            return self._millor_accio_candidats(estat, desempat_aima, aleatori)
+
+        peticions, origens, deltes = self.deltes(estat)
+        if deltes.size == 0:
+            return None, None
+        millor_delta = deltes.max()
+        if millor_delta == -np.inf:
+            return None, None
+
+        if desempat_aima:
+            # Deltes en l'ordre de generate_all_actions: per cada petició, els camions destí menys l'origen i els no factibles
+            j, desti = divmod(self._desempat_aima(deltes.T.ravel(), millor_delta, aleatori), self.num_camions)
+        else:
+            empats = np.flatnonzero(deltes == millor_delta)
+            desti, j = np.unravel_index(empats[0] if len(empats) == 1 else aleatori.choice(empats), deltes.shape)
+        return mourePeticio(int(peticions[j]), int(origens[j]), int(desti)), float(millor_delta)
+
+    def _millor_accio_candidats(self, estat: StateRepresentation, desempat_aima: bool, aleatori: random.Random):
+        peticions, origens, destins, deltes = self.deltes_candidats(estat)
+        if deltes.size == 0:
+            return None, None
+        millor_delta = deltes.max()
+        if millor_delta == -np.inf:
+            return None, None
+
+        if desempat_aima:
+            # Ordre de generate_all_actions(veins_propers): per cada petició, els seus candidats factibles
+            j, i = divmod(self._desempat_aima(deltes.T.ravel(), millor_delta, aleatori), deltes.shape[0])
+        else:
+            empats = np.flatnonzero(deltes == millor_delta)
+            i, j = np.unravel_index(empats[0] if len(empats) == 1 else aleatori.choice(empats), deltes.shape)
+        return mourePeticio(int(peticions[j]), int(origens[j]), int(destins[i, j])), float(millor_delta)
+
+    def _desempat_aima(self, deltes: np.ndarray, millor_delta: float, aleatori: random.Random) -> int:
+        '''
+        Escull un dels màxims de deltes (en l'ordre de generate_all_actions, -inf pels operadors que no es generen)
+        consumint els nombres aleatoris igual que argmax_random_tie d'aima: barreja els operadors i es queda el primer màxim.
+        :return: posició escollida dins de deltes
+        '''
+        generats = np.flatnonzero(deltes != -np.inf)
+        index = list(range(len(generats)))
+        aleatori.shuffle(index)
+        return int(generats[next(i for i in index if deltes[generats[i]] == millor_delta)])
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+from .camions_distancies import DistanciesManhattan
+
+
+class CostViatges(object):
+    '''
+    Memòria cau acotada (LRU) del cost dels viatges: per cada clau (camió, peticions del viatge) guarda
+    els km del viatge i els ingressos de les peticions que serveix. Un viatge té com a molt dues peticions i
+    surt sempre del centre del seu camió, de manera que durant la cerca es tornen a costejar els mateixos
+    viatges una vegada i una altra. Forma part de la InstanciaProblema i la comparteixen tots els estats.
+
+    Cada viatge es costeja amb la seva ruta canònica mínima: l'ordre de les peticions dins del viatge no importa
+    (la clau és el conjunt ordenat de peticions), es visita cada gasolinera una sola vegada encara que hi hagi
+    dues peticions seves, i de les dues maneres de recórrer dues gasolineres es pren la més curta.
+    '''
+
+    def __init__(self, distancies: DistanciesManhattan, gasolinera_per_peticio: Sequence[int],
+                 ingressos_per_peticio: Sequence[float], capacitat: int = 1 << 16):
+        '''
+        :param distancies: distàncies de la instància
+        :param gasolinera_per_peticio: gasolinera de cada petició
+        :param ingressos_per_peticio: ingressos de servir avui cada petició
+        :param capacitat: nombre màxim de viatges guardats; quan s'omple s'oblida el menys utilitzat recentment
+        '''
+        self.distancies = distancies
+        self.gasolinera_per_peticio = gasolinera_per_peticio
+        self.ingressos_per_peticio = ingressos_per_peticio
+        self.capacitat = capacitat
+        self.encerts = 0
+        self.errades = 0
+        self._viatges = OrderedDict()
+
+    def cost(self, id_camio: int, viatge: Sequence[int]) -> Tuple[float, float]:
+        '''
+        Km i ingressos d'un viatge del camió, que surt del centre, visita les gasolineres de les peticions
+        per la ruta mínima (veure ruta) i torna al centre.
+        :return: parella (km, ingressos)
+        '''
+        if len(viatge) == 2 and viatge[0] > viatge[1]:
+            clau = (id_camio, viatge[1], viatge[0])
+        else:
+            clau = (id_camio, *viatge)
+        valor = self._viatges.get(clau)
+        if valor is not None:
+            self.encerts += 1
+            self._viatges.move_to_end(clau)
+            return valor
+
+        self.errades += 1
+        km = self.distancies.km_ruta(id_camio, self.ruta(id_camio, viatge))
+        ingressos = sum(self.ingressos_per_peticio[i_peticio] for i_peticio in viatge)
+        valor = (km, ingressos)
+        self._viatges[clau] = valor
+        if len(self._viatges) > self.capacitat:
+            self._viatges.popitem(last=False)
+        return valor
+
+    def ruta(self, id_camio: int, viatge: Sequence[int]) -> List[int]:
+        '''
+        Gasolineres que visita el viatge, en l'ordre de la ruta mínima: cada gasolinera una sola vegada i,
+        si n'hi ha dues, en l'ordre que fa menys km (en cas d'empat, la de menys id primer).
+        Els viatges de més de dues gasolineres es recorren en l'ordre de la llista.
+        '''
+        gasolineres = list(dict.fromkeys(self.gasolinera_per_peticio[i_peticio] for i_peticio in viatge))
+        if len(gasolineres) == 2:
+            g1, g2 = sorted(gasolineres)
+            if self.distancies.km_ruta(id_camio, (g2, g1)) < self.distancies.km_ruta(id_camio, (g1, g2)):
+                return [g2, g1]
+            return [g1, g2]
+        return gasolineres
+
+    def km(self, id_camio: int, viatge: Sequence[int]) -> float:
+        return self.cost(id_camio, viatge)[0]
+
+    def ingressos(self, id_camio: int, viatge: Sequence[int]) -> float:
+        return self.cost(id_camio, viatge)[1]
+
+    def buida(self):
+        '''
+        Oblida tots els viatges guardats i posa els comptadors a zero.
+        '''
+        self._viatges.clear()
+        self.encerts = 0
+        self.errades = 0
+
+    def __len__(self):
+        return len(self._viatges)
+
+    def __repr__(self):
+        return f"CostViatges(viatges={len(self)}, capacitat={self.capacitat}, encerts={self.encerts}, errades={self.errades})"